@@ -0,0 +1,107 @@
+"""
+Benchmark of the sync and the async request path (ASYNC_SUPABASE) of the listings endpoints.
+
+Concurrent clients create a listing with image, read all listings, read the created
+listing and delete it again, first with the sync and then with the async request path.
+Requests per second and p99 latency per endpoint are printed for both modes.
+
+The benchmark talks to the Supabase instance configured by SUPABASE_URL and SUPABASE_KEY
+(use a local or test instance, listings are created and deleted). The in-process cache
+is disabled, so every request measures its Supabase round trips.
+
+Usage (from src/backend):
+    python benchmarks/async_benchmark.py
+"""
+
+import base64
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+os.environ.setdefault("PORT", "8000")
+os.environ.setdefault("FRONTEND_ENDPOINT", "http://localhost:5173")
+os.environ["CACHE_ENABLED"] = "false"
+
+# Ensure project root is on sys.path so the top-level package 'src' is importable
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import src.app as app_module
+
+
+CLIENTS = 16
+ROUNDS = 10
+
+
+def make_b64_image():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 30, 30)).save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+B64_IMAGE = make_b64_image()
+
+
+def client_rounds(client_id: int):
+    latencies = {"create": [], "list": [], "get": [], "delete": []}
+
+    with app_module.app.test_client() as client:
+        for i in range(ROUNDS):
+            start = time.perf_counter()
+            resp = client.post("/listings?force=true", json={
+                "type": "lost",
+                "created_at": time.strftime("%Y-%m-%d"),
+                "title": f"Benchmark {client_id}-{i}",
+                "description": "created by benchmarks/async_benchmark.py",
+                "room": "A006",
+                "category": "Other",
+                "b64_image": B64_IMAGE
+            })
+            latencies["create"].append(time.perf_counter() - start)
+            assert resp.status_code == 201, resp.get_json()
+            uuid = resp.get_json()["uuid"]
+
+            start = time.perf_counter()
+            resp = client.get("/listings", query_string={"category": "Other", "limit": 20})
+            latencies["list"].append(time.perf_counter() - start)
+            assert resp.status_code == 200
+
+            start = time.perf_counter()
+            resp = client.get(f"/listings/{uuid}")
+            latencies["get"].append(time.perf_counter() - start)
+            assert resp.status_code == 200
+
+            start = time.perf_counter()
+            resp = client.delete(f"/listings/{uuid}")
+            latencies["delete"].append(time.perf_counter() - start)
+            assert resp.status_code == 200
+
+    return latencies
+
+
+def p99(latencies: list):
+    latencies = sorted(latencies)
+    return latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+
+
+def benchmark(async_supabase: bool):
+    app_module.ASYNC_SUPABASE = async_supabase
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+        results = list(pool.map(client_rounds, range(CLIENTS)))
+    seconds = time.perf_counter() - start
+
+    requests = sum(len(latencies) for result in results for latencies in result.values())
+    summary = {"mode": "async" if async_supabase else "sync", "rps": round(requests / seconds, 1)}
+    for endpoint in ["create", "list", "get", "delete"]:
+        latencies = [latency for result in results for latency in result[endpoint]]
+        summary[f"{endpoint}_p99_ms"] = round(p99(latencies) * 1000, 1)
+    return summary
+
+
+if __name__ == "__main__":
+    for async_supabase in [False, True]:
+        print(benchmark(async_supabase))
@@ -0,0 +1,285 @@
+"""
+Benchmark of the API endpoints against the in-process Supabase stand-in (fake_supabase.py).
+
+Seeds 1k, 10k and 100k listings with images and measures, per endpoint, throughput,
+p50/p99 latency and peak memory (traced in a separate, shorter pass, as tracing slows
+requests down). The duplicate check is measured by POST /listings without force and
+POST /listings/duplicates:check. No Supabase project is needed.
+
+The results are written as JSON (one entry per listings count and endpoint), so runs of
+different commits can be compared with --compare.
+
+Usage (from src/backend):
+    python benchmarks/endpoint_benchmark.py
+    python benchmarks/endpoint_benchmark.py --sizes 1000 --latency 0.01 --jitter 0.005 --output before.json
+    python benchmarks/endpoint_benchmark.py --sizes 1000 --output after.json --compare before.json
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from PIL import Image
+
+# app.py reads its configuration at import time, the benchmark never talks to Supabase
+os.environ.setdefault("PORT", "8000")
+os.environ.setdefault("FRONTEND_ENDPOINT", "http://localhost:5173")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "benchmark")
+
+# Ensure project root is on sys.path so the top-level package 'src' is importable
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import src.app as app_module
+from fake_supabase import FakeSupabase, install
+
+
+SIZES = [1_000, 10_000, 100_000]
+# distinct images of the seeded listings, stored once each like the app stores them (by hash)
+IMAGES = 50
+ROOMS = ["A006", "B002", "B010", "C002", "Cafeteria", "Library", "Gym"]
+CATEGORIES = ["Electronics", "Clothing", "Keys", "Documents", "Accessories", "Other"]
+WORDS = sorted(set(app_module.SYNONYMS).union(*app_module.SYNONYMS.values()))
+FILLER = [f"wort{i}" for i in range(2000)] + ["schwarz", "blau", "rot", "klein", "groß", "usb-c", "leder"]
+QUERIES = ["handy", "schwarze jacke", "smartfone", "schlüssel cafeteria", "ladekabel usb-c"]
+
+
+def make_image_bin(i: int, rng: random.Random):
+    buffer = io.BytesIO()
+    image = Image.new("RGB", (320, 240), (rng.randrange(256), rng.randrange(256), i % 256))
+    for _ in range(20):
+        x, y = rng.randrange(300), rng.randrange(220)
+        image.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (x, y, x + 20, y + 20))
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_listing(i: int, rng: random.Random, image_hashes: list):
+    created_at = date(2026, 10, 1) - timedelta(days=rng.randrange(14))
+    return {
+        "uuid": f"00000000-0000-4000-8000-{i:012d}",
+        "type": rng.choice(["lost", "found"]),
+        "created_at": created_at.isoformat(),
+        "title": " ".join([rng.choice(WORDS)] + rng.sample(FILLER, 2)),
+        "description": " ".join(rng.sample(FILLER, 8) + [rng.choice(WORDS)]),
+        "room": rng.choice(ROOMS),
+        "category": rng.choice(CATEGORIES),
+        "contact_email": None,
+        "image_hash": rng.choice(image_hashes),
+    }
+
+
+# returns a fake Supabase with `size` listings and their images, and the uuids of the listings
+def seed(size: int, latency: float, jitter: float):
+    rng = random.Random(size)
+    fake = FakeSupabase(latency=latency, jitter=jitter, seed=size)
+
+    image_hashes = []
+    for i in range(IMAGES):
+        images = app_module.ingest_image(io.BytesIO(make_image_bin(i, rng)))
+        image_hash = app_module.images_hash(images)
+        fake.seed_object("images", app_module.blob_path(image_hash, "full"), images["full"])
+        fake.seed_object("images", app_module.blob_path(image_hash, "thumb"), images["thumb"])
+        image_hashes.append(image_hash)
+
+    listings = [make_listing(i, rng, image_hashes) for i in range(size)]
+    fake.seed_rows("listings", listings)
+    return fake, [listing["uuid"] for listing in listings]
+
+
+# resets the in-process state of the app and points it at `fake`
+def reset_app(fake: FakeSupabase, async_supabase: bool):
+    install(app_module, fake, async_supabase)
+    app_module.listings_cache.clear()
+    app_module.image_cache.clear()
+    with app_module.listings_index.lock:
+        app_module.listings_index.__init__(app_module.listings_index.match_cache_size)
+    app_module.listings_index.ensure_built()
+
+
+def make_b64_image(rng: random.Random):
+    return "data:image/png;base64," + base64.b64encode(make_image_bin(rng.randrange(1000), rng)).decode("utf-8")
+
+
+def draft(rng: random.Random):
+    return {
+        "type": rng.choice(["lost", "found"]),
+        "created_at": "2026-10-01",
+        "title": " ".join([rng.choice(WORDS)] + rng.sample(FILLER, 2)),
+        "description": "created by benchmarks/endpoint_benchmark.py",
+        "room": rng.choice(ROOMS),
+        "category": rng.choice(CATEGORIES),
+        "contact_email": None,
+    }
+
+
+# endpoint name -> (number of requests, function sending one request with a test client)
+def endpoints(uuids: list, requests: int):
+    rng = random.Random(0)
+    b64_images = [make_b64_image(rng) for _ in range(10)]
+    created = []
+
+    def create(client):
+        resp = client.post("/listings?force=true", json={**draft(rng), "b64_image": rng.choice(b64_images)})
+        if resp.status_code == 201:
+            created.append(resp.get_json()["uuid"])
+        return resp
+
+    def delete(client):
+        # deletes the listings created before, so the table keeps its size
+        uuid = created.pop() if created else rng.choice(uuids)
+        return client.delete(f"/listings/{uuid}")
+
+    return {
+        "list_page": (requests, lambda client: client.get("/listings", query_string={
+            "category": rng.choice(CATEGORIES), "room": rng.choice(ROOMS), "limit": 20, "images": "none"
+        })),
+        "list_page_inline_images": (requests, lambda client: client.get("/listings", query_string={
+            "category": rng.choice(CATEGORIES), "limit": 20
+        })),
+        "list_all": (max(requests // 20, 5), lambda client: client.get("/listings", query_string={"images": "none"})),
+        "list_all_streamed": (max(requests // 20, 5), lambda client: client.get("/listings", query_string={"images": "none", "stream": "json"})),
+        "get": (requests, lambda client: client.get(f"/listings/{rng.choice(uuids)}", query_string={"images": "none"})),
+        "get_image": (requests, lambda client: client.get(f"/listings/{rng.choice(uuids)}/image")),
+        "search": (requests, lambda client: client.get("/listings/search", query_string={"q": rng.choice(QUERIES), "limit": 20})),
+        "matches": (requests, lambda client: client.get(f"/listings/{rng.choice(uuids)}/matches")),
+        "duplicate_check_create": (requests, lambda client: client.post("/listings", json=draft(rng))),
+        "duplicate_check_batch": (requests, lambda client: client.post("/listings/duplicates:check", json={
+            "listings": [draft(rng) for _ in range(10)]
+        })),
+        "create": (requests, create),
+        "delete": (requests, delete),
+    }
+
+
+# sends `requests` requests from `concurrency` threads, returns latencies, status codes and wall time
+def run_requests(send, requests: int, concurrency: int):
+    def worker(count: int):
+        latencies, statuses = [], []
+        with app_module.app.test_client() as client:
+            for _ in range(count):
+                start = time.perf_counter()
+                resp = send(client)
+                # streamed responses are only complete once their body is read
+                resp.get_data()
+                latencies.append(time.perf_counter() - start)
+                statuses.append(resp.status_code)
+        return latencies, statuses
+
+    counts = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, counts))
+    seconds = time.perf_counter() - start
+    latencies = sorted(latency for result in results for latency in result[0])
+    statuses = [status for result in results for status in result[1]]
+    return latencies, statuses, seconds
+
+
+# peak of traced memory allocated while sending a few requests, in KiB
+def peak_memory(send, requests: int):
+    tracemalloc.start()
+    try:
+        with app_module.app.test_client() as client:
+            baseline = tracemalloc.get_traced_memory()[0]
+            for _ in range(requests):
+                send(client).get_data()
+            return round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def percentile(latencies: list, share: float):
+    return latencies[max(int(len(latencies) * share) - 1, 0)]
+
+
+def benchmark(size: int, args):
+    fake, uuids = seed(size, args.latency, args.jitter)
+    reset_app(fake, args.async_supabase)
+
+    results = []
+    for endpoint, (requests, send) in endpoints(uuids, args.requests).items():
+        latencies, statuses, seconds = run_requests(send, requests, args.concurrency)
+        results.append({
+            "listings": size,
+            "endpoint": endpoint,
+            "requests": requests,
+            "rps": round(requests / seconds, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "peak_memory_kib": peak_memory(send, args.memory_requests),
+            "statuses": {str(status): statuses.count(status) for status in sorted(set(statuses))},
+        })
+        print(results[-1])
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+# prints the change of latency and throughput against the results of an earlier run
+def compare(results: list, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {(r["listings"], r["endpoint"]): r for r in json.load(f)["results"]}
+    for result in results:
+        before = baseline.get((result["listings"], result["endpoint"]))
+        if before is None:
+            continue
+        changes = {
+            key: f"{(result[key] / before[key] - 1) * 100:+.1f}%"
+            for key in ["rps", "p50_ms", "p99_ms", "peak_memory_kib"] if before[key]
+        }
+        print(result["listings"], result["endpoint"], changes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="numbers of seeded listings")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per Supabase request")
+    parser.add_argument("--jitter", type=float, default=0.002, help="random extra seconds per Supabase request")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--memory-requests", type=int, default=10, help="requests per endpoint while tracing memory")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--async", dest="async_supabase", action="store_true", help="use the async request path (ASYNC_SUPABASE)")
+    parser.add_argument("--output", default="benchmark_results.json", help="path of the JSON results")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark(size, args))
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "config": {
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "concurrency": args.concurrency,
+                "async_supabase": args.async_supabase,
+                "cache_enabled": app_module.CACHE_ENABLED,
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
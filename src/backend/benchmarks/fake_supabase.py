@@ -0,0 +1,458 @@
+"""
+In-process stand-in for the Supabase client, so the API can be benchmarked without a Supabase project.
+
+Implements the parts of the table (PostgREST) and storage APIs that src/app.py uses:
+select (with count), eq, neq, gt, gte, lt, lte, in_, or_, order, limit, range, insert,
+update and delete on tables, and upload, download, exists, list and remove on storage
+buckets. Every request waits `latency` seconds plus a random share of `jitter` seconds,
+like a round trip to Supabase. Rows are matched by scanning the table (uuid lookups
+excepted), so large tables cost more than they would with database indexes.
+
+Usage:
+    import src.app as app_module
+    from fake_supabase import FakeSupabase, install
+
+    fake = FakeSupabase(latency=0.005, jitter=0.002)
+    install(app_module, fake)
+"""
+
+import asyncio
+import copy
+import random
+import re
+import threading
+import time
+import uuid as uuidlib
+from collections import Counter
+from datetime import datetime, timezone
+
+from postgrest.exceptions import APIError
+from storage3.utils import StorageException
+
+
+class FakeResponse:
+    """
+    Result of a table request, like postgrest's APIResponse.
+    """
+
+    def __init__(self, data: list, count: int | None = None):
+        self.data = data
+        self.count = count
+
+
+# comparison operators of PostgREST filters
+OPERATORS: dict = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+    "in": lambda a, b: a in b,
+}
+
+
+# splits a PostgREST logic tree ("a.eq.1,and(b.lt.2,c.gt.3)") at its top-level commas
+def split_conditions(expression: str):
+    parts, depth, start, quoted = [], 0, 0, False
+    for i, c in enumerate(expression):
+        if c == '"':
+            quoted = not quoted
+        elif not quoted and c == "(":
+            depth += 1
+        elif not quoted and c == ")":
+            depth -= 1
+        elif not quoted and c == "," and depth == 0:
+            parts.append(expression[start:i])
+            start = i + 1
+    parts.append(expression[start:])
+    return parts
+
+
+# parses a PostgREST logic tree as used by or_() into a predicate on rows
+def parse_condition(expression: str):
+    match = re.fullmatch(r"(and|or)\((.*)\)", expression)
+    if match:
+        conditions = [parse_condition(part) for part in split_conditions(match.group(2))]
+        combine = all if match.group(1) == "and" else any
+        return lambda row: combine(condition(row) for condition in conditions)
+
+    column, op, value = expression.split(".", 2)
+    if value.startswith('"') and value.endswith('"'):
+        value = value[1:-1]
+    compare = OPERATORS[op]
+    return lambda row: compare(row.get(column), value)
+
+
+def is_uuid(value):
+    try:
+        uuidlib.UUID(str(value))
+    except ValueError:
+        return False
+    return True
+
+
+class FakeQuery:
+    """
+    Request builder for one table, mirrors the builder methods of postgrest.
+    """
+
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.method = "select"
+        self.columns = None
+        self.count = None
+        self.payload = None
+        self.filters = []
+        self.orders = []
+        self.offset = 0
+        self.limit_rows = None
+        self.uuids = None         # rows restricted by an eq or in_ filter on the uuid column
+        self.error = None         # raised on execute, like errors of the database
+
+    def select(self, *columns: str, count: str | None = None):
+        self.method = "select"
+        names = [name.strip() for column in columns for name in column.split(",")]
+        self.columns = None if "*" in names or not names else names
+        self.count = count
+        return self
+
+    def insert(self, payload: dict | list):
+        self.method = "insert"
+        self.payload = payload
+        return self
+
+    def update(self, payload: dict):
+        self.method = "update"
+        self.payload = payload
+        return self
+
+    def delete(self):
+        self.method = "delete"
+        return self
+
+    def filter(self, column: str, op: str, value):
+        compare = OPERATORS[op]
+        self.filters.append(lambda row: compare(row.get(column), value))
+        if column == "uuid":
+            # the uuid column is typed, malformed values fail like in PostgreSQL
+            for uuid in (value if op == "in" else [value]):
+                if not is_uuid(uuid):
+                    self.error = APIError({"message": f'invalid input syntax for type uuid: "{uuid}"', "code": "22P02"})
+            if op in ("eq", "in"):
+                uuids = {value} if op == "eq" else set(value)
+                self.uuids = uuids if self.uuids is None else self.uuids & uuids
+        return self
+
+    def eq(self, column: str, value):
+        return self.filter(column, "eq", value)
+
+    def neq(self, column: str, value):
+        return self.filter(column, "neq", value)
+
+    def gt(self, column: str, value):
+        return self.filter(column, "gt", value)
+
+    def gte(self, column: str, value):
+        return self.filter(column, "gte", value)
+
+    def lt(self, column: str, value):
+        return self.filter(column, "lt", value)
+
+    def lte(self, column: str, value):
+        return self.filter(column, "lte", value)
+
+    def in_(self, column: str, values):
+        return self.filter(column, "in", set(values))
+
+    def or_(self, expression: str):
+        self.filters.append(parse_condition(f"or({expression})"))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size: int):
+        self.limit_rows = size
+        return self
+
+    def range(self, start: int, end: int):
+        self.offset = start
+        self.limit_rows = end - start + 1
+        return self
+
+    def execute(self):
+        self.client.wait("table", self.method)
+        return self.run()
+
+    def run(self):
+        if self.error is not None:
+            raise self.error
+        with self.client.lock:
+            rows = self.client.tables.setdefault(self.table, {})
+            if self.method == "insert":
+                return FakeResponse(self.insert_rows(rows))
+
+            if self.uuids is not None:
+                candidates = [rows[uuid] for uuid in self.uuids if uuid in rows]
+            else:
+                candidates = rows.values()
+            matched = [row for row in candidates if all(f(row) for f in self.filters)]
+
+            if self.method == "update":
+                for row in matched:
+                    row.update(copy.deepcopy(self.payload))
+                return FakeResponse([dict(row) for row in matched])
+            if self.method == "delete":
+                for row in matched:
+                    del rows[row["uuid"]]
+                return FakeResponse([dict(row) for row in matched])
+
+            for column, desc in reversed(self.orders):
+                # NULL sorts last ascending and first descending, like in PostgreSQL
+                matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            total = len(matched)
+            end = None if self.limit_rows is None else self.offset + self.limit_rows
+            matched = matched[self.offset:end]
+            if self.columns is None:
+                data = [dict(row) for row in matched]
+            else:
+                data = [{column: row.get(column) for column in self.columns} for row in matched]
+            return FakeResponse(data, total if self.count else None)
+
+    def insert_rows(self, rows: dict):
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        new_rows = []
+        for item in payload:
+            row = copy.deepcopy(item)
+            row.setdefault("uuid", str(uuidlib.uuid4()))
+            if row["uuid"] in rows or any(row["uuid"] == new["uuid"] for new in new_rows):
+                raise APIError({"message": "duplicate key value violates unique constraint", "code": "23505"})
+            new_rows.append(row)
+        for row in new_rows:
+            rows[row["uuid"]] = row
+        return [dict(row) for row in new_rows]
+
+
+class AsyncFakeQuery(FakeQuery):
+    async def execute(self):
+        await self.client.wait_async("table", self.method)
+        return self.run()
+
+
+class FakeBucket:
+    """
+    One storage bucket, mirrors the file API of storage3.
+    """
+
+    def __init__(self, client: "FakeSupabase", name: str):
+        self.client = client
+        self.name = name
+
+    @property
+    def objects(self):
+        # path -> (bytes, content type, created at)
+        return self.client.buckets.setdefault(self.name, {})
+
+    def upload(self, path: str, file, file_options: dict | None = None):
+        self.client.wait("storage", "upload")
+        return self.run_upload(path, file, file_options)
+
+    def download(self, path: str, options: dict | None = None):
+        self.client.wait("storage", "download")
+        return self.run_download(path)
+
+    def exists(self, path: str):
+        self.client.wait("storage", "exists")
+        with self.client.lock:
+            return path in self.objects
+
+    def remove(self, paths: list):
+        self.client.wait("storage", "remove")
+        return self.run_remove(paths)
+
+    def list(self, path: str | None = None, options: dict | None = None):
+        self.client.wait("storage", "list")
+        return self.run_list(path, options)
+
+    def run_upload(self, path: str, file, file_options: dict | None):
+        file_options = file_options or {}
+        if isinstance(file, str):
+            with open(file, "rb") as f:
+                data = f.read()
+        elif isinstance(file, (bytes, bytearray)):
+            data = bytes(file)
+        else:
+            data = file.read()
+        upsert = str(file_options.get("upsert", "false")).lower() == "true"
+        content_type = file_options.get("content-type", "text/plain;charset=UTF-8")
+        with self.client.lock:
+            if path in self.objects and not upsert:
+                raise StorageException({"statusCode": 409, "error": "Duplicate", "message": "The resource already exists"})
+            self.objects[path] = (data, content_type, datetime.now(timezone.utc).isoformat())
+        return {"path": path, "full_path": f"{self.name}/{path}"}
+
+    def run_download(self, path: str):
+        with self.client.lock:
+            stored = self.objects.get(path)
+        if stored is None:
+            raise StorageException({"statusCode": 404, "error": "not_found", "message": "Object not found"})
+        return stored[0]
+
+    def run_remove(self, paths: list):
+        removed = []
+        with self.client.lock:
+            for path in paths:
+                stored = self.objects.pop(path, None)
+                if stored is not None:
+                    removed.append({"name": path, "bucket_id": self.name, "metadata": {"size": len(stored[0]), "mimetype": stored[1]}})
+        return removed
+
+    def run_list(self, path: str | None, options: dict | None):
+        options = options or {}
+        prefix = f"{path.strip('/')}/" if path else ""
+        entries = {}
+        with self.client.lock:
+            for name, (data, content_type, created_at) in self.objects.items():
+                if not name.startswith(prefix):
+                    continue
+                rest = name[len(prefix):]
+                if "/" in rest:
+                    folder = rest.split("/", 1)[0]
+                    entries[folder] = {"name": folder, "id": None, "updated_at": None, "created_at": None, "metadata": None}
+                else:
+                    entries[rest] = {
+                        "name": rest,
+                        "id": name,
+                        "updated_at": created_at,
+                        "created_at": created_at,
+                        "metadata": {"size": len(data), "mimetype": content_type},
+                    }
+        names = sorted(entries)
+        offset = options.get("offset", 0)
+        return [entries[name] for name in names[offset:offset + options.get("limit", 100)]]
+
+
+class AsyncFakeBucket(FakeBucket):
+    async def upload(self, path: str, file, file_options: dict | None = None):
+        await self.client.wait_async("storage", "upload")
+        return self.run_upload(path, file, file_options)
+
+    async def download(self, path: str, options: dict | None = None):
+        await self.client.wait_async("storage", "download")
+        return self.run_download(path)
+
+    async def exists(self, path: str):
+        await self.client.wait_async("storage", "exists")
+        with self.client.lock:
+            return path in self.objects
+
+    async def remove(self, paths: list):
+        await self.client.wait_async("storage", "remove")
+        return self.run_remove(paths)
+
+    async def list(self, path: str | None = None, options: dict | None = None):
+        await self.client.wait_async("storage", "list")
+        return self.run_list(path, options)
+
+
+class FakeStorage:
+    def __init__(self, client: "FakeSupabase", bucket_class: type):
+        self.client = client
+        self.bucket_class = bucket_class
+
+    def from_(self, name: str):
+        return self.bucket_class(self.client, name)
+
+
+class FakeSupabase:
+    """
+    In-process Supabase client with tables and storage buckets held in memory.
+
+    Parameters
+    ----------
+    latency : float
+        Seconds every request waits, like a round trip to Supabase.
+    jitter : float
+        Up to this many seconds are added to the latency of every request, uniformly at random.
+    seed : int
+        Seed of the jitter.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.tables = {}          # table name -> {uuid -> row}
+        self.buckets = {}         # bucket name -> {path -> (bytes, content type, created at)}
+        self.calls = Counter()    # "table.select", "storage.download", ... -> number of requests
+        self.lock = threading.Lock()
+        self.storage = FakeStorage(self, FakeBucket)
+
+    def table(self, name: str):
+        return FakeQuery(self, name)
+
+    def delay(self, service: str, operation: str):
+        with self.lock:
+            self.calls[f"{service}.{operation}"] += 1
+            return self.latency + self.random.uniform(0, self.jitter)
+
+    def wait(self, service: str, operation: str):
+        seconds = self.delay(service, operation)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    async def wait_async(self, service: str, operation: str):
+        seconds = self.delay(service, operation)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def seed_rows(self, table: str, rows: list):
+        """
+        Add rows directly, without latency.
+        """
+
+        with self.lock:
+            stored = self.tables.setdefault(table, {})
+            for row in rows:
+                stored[row["uuid"]] = dict(row)
+
+    def seed_object(self, bucket: str, path: str, data: bytes, content_type: str = "image/webp"):
+        """
+        Add a storage object directly, without latency.
+        """
+
+        with self.lock:
+            self.buckets.setdefault(bucket, {})[path] = (data, content_type, datetime.now(timezone.utc).isoformat())
+
+
+class AsyncFakeSupabase:
+    """
+    Async client on the tables and buckets of a FakeSupabase, like supabase's AsyncClient.
+    """
+
+    def __init__(self, client: FakeSupabase):
+        self.client = client
+        self.storage = FakeStorage(client, AsyncFakeBucket)
+
+    # the queries and buckets wait and count on the shared client
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def table(self, name: str):
+        return AsyncFakeQuery(self, name)
+
+
+# replaces the Supabase clients of the app module by `fake`.
+# With async_supabase, the async request path (ASYNC_SUPABASE) runs on the fake as well.
+def install(app_module, fake: FakeSupabase, async_supabase: bool = False):
+    app_module.supabase = fake
+    app_module.ASYNC_SUPABASE = async_supabase
+    if async_supabase:
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name="supabase-async", daemon=True).start()
+        with app_module.async_loop_lock:
+            app_module.async_loop = loop
+            app_module.async_supabase = AsyncFakeSupabase(fake)
@@ -0,0 +1,86 @@
+"""
+Benchmark for GET /listings/search.
+
+Fills the in-memory listings index with synthetic listings (no database access)
+and measures the latency of search queries at 10k and 100k listings.
+
+Usage (from src/backend):
+    python benchmarks/search_benchmark.py
+"""
+
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+# app.py reads its configuration at import time, the benchmark never talks to Supabase
+os.environ.setdefault("PORT", "8000")
+os.environ.setdefault("FRONTEND_ENDPOINT", "http://localhost:5173")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "benchmark")
+
+# Ensure project root is on sys.path so the top-level package 'src' is importable
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.app import app, listings_index, SYNONYMS
+
+
+SIZES = [10_000, 100_000]
+QUERIES = ["handy", "schwarze jacke", "smartfone", "schlüssel cafeteria", "ladekabel usb-c", "brile"]
+REPETITIONS = 50
+
+WORDS = sorted(set(SYNONYMS).union(*SYNONYMS.values()))
+FILLER = [f"wort{i}" for i in range(5000)] + ["schwarz", "blau", "rot", "klein", "groß", "usb-c", "leder"]
+
+
+def make_listing(i: int, rng: random.Random):
+    return {
+        "uuid": f"00000000-0000-0000-0000-{i:012d}",
+        "type": rng.choice(["lost", "found"]),
+        "created_at": f"2026-10-{rng.randint(1, 28):02d}",
+        "title": " ".join([rng.choice(WORDS)] + rng.sample(FILLER, 2)),
+        "description": " ".join(rng.sample(FILLER, 8) + [rng.choice(WORDS)]),
+        "room": rng.choice(["A006", "B002", "B010", "C002", "Cafeteria"]),
+        "category": rng.choice(["Electronics", "Clothing", "Keys", "Other"]),
+        "contact_email": None,
+    }
+
+
+def fill_index(size: int):
+    rng = random.Random(size)
+    with listings_index.lock:
+        listings_index.__init__(listings_index.match_cache_size)
+        for i in range(size):
+            listings_index._add(make_listing(i, rng))
+        listings_index.ready = True
+        # the synthetic index must not be resynced with the (unreachable) listings table
+        listings_index.synced_at = math.inf
+
+
+def benchmark(size: int):
+    start = time.perf_counter()
+    fill_index(size)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    with app.test_client() as client:
+        for _ in range(REPETITIONS):
+            for query in QUERIES:
+                start = time.perf_counter()
+                resp = client.get("/listings/search", query_string={"q": query, "limit": 20})
+                latencies.append(time.perf_counter() - start)
+                assert resp.status_code == 200
+
+    latencies.sort()
+    return {
+        "listings": size,
+        "build_s": round(build_seconds, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    for size in SIZES:
+        print(benchmark(size))
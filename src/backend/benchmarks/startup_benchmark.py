@@ -0,0 +1,159 @@
+"""
+Benchmark of the startup time of the API, i.e. the cold start of a worker process.
+
+Every run starts a fresh Python process, which measures importing src.app, create_app(),
+the first request (against the in-process Supabase stand-in, fake_supabase.py) and what
+is deferred to first use: creating the Supabase client and importing the dependencies of
+matching, duplicate detection, images and the scheduler. The process is started without
+PORT and Supabase credentials, so the benchmark also checks that importing the app needs
+neither. No Supabase project is needed, the client is created but never connects.
+
+Median, min and max per stage are printed and written as JSON, so runs of different
+commits can be compared with --compare.
+
+Usage (from src/backend):
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 20 --output before.json
+    python benchmarks/startup_benchmark.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# runs in the fresh process, prints the seconds per stage as JSON
+CHILD = """
+import json, resource, sys, time
+
+stages = {}
+start = time.perf_counter()
+import src.app as app_module
+stages["import"] = time.perf_counter() - start
+stages["modules"] = len(sys.modules)
+
+start = time.perf_counter()
+app = app_module.create_app({"TESTING": True})
+stages["create_app"] = time.perf_counter() - start
+
+sys.path.insert(0, "benchmarks")
+from fake_supabase import FakeSupabase, install
+fake = FakeSupabase()
+fake.seed_rows("listings", [])
+real_supabase = app_module.supabase
+install(app_module, fake)
+start = time.perf_counter()
+with app.test_client() as client:
+    assert client.get("/listings", query_string={"images": "none"}).status_code == 200
+stages["first_request"] = time.perf_counter() - start
+
+# paid on first use instead of at startup
+app_module.supabase = real_supabase
+start = time.perf_counter()
+app_module.supabase.get()
+stages["supabase_client"] = time.perf_counter() - start
+
+start = time.perf_counter()
+import numpy, rapidfuzz.process, PIL.Image, apscheduler.schedulers.background
+stages["deferred_imports"] = time.perf_counter() - start
+
+stages["max_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps(stages))
+"""
+
+# stages measured in seconds, reported in milliseconds
+TIMED_STAGES = ["import", "create_app", "first_request", "supabase_client", "deferred_imports"]
+
+
+def child_env():
+    env = {key: value for key, value in os.environ.items() if key not in ("PORT", "SUPABASE_URL", "SUPABASE_KEY")}
+    # the client is created with these, but never used
+    env["SUPABASE_URL"] = "http://localhost:54321"
+    env["SUPABASE_KEY"] = "benchmark"
+    return env
+
+
+# one cold start, returns the stages printed by CHILD
+def run_once(env: dict):
+    # importing without credentials has to work, they are only needed for supabase_client
+    bare_env = {key: value for key, value in env.items() if key not in ("SUPABASE_URL", "SUPABASE_KEY")}
+    subprocess.run([sys.executable, "-c", "import src.app"], cwd=BACKEND_DIR, env=bare_env, check=True)
+
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs: list):
+    results = []
+    for stage in TIMED_STAGES:
+        values = [run[stage] * 1000 for run in runs]
+        results.append({
+            "stage": stage,
+            "median_ms": round(statistics.median(values), 1),
+            "min_ms": round(min(values), 1),
+            "max_ms": round(max(values), 1),
+        })
+    for stage in ["modules", "max_rss_mib"]:
+        results.append({"stage": stage, "median": round(statistics.median(run[stage] for run in runs), 1)})
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+# prints the change of every stage against the results of an earlier run
+def compare(results: list, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {r["stage"]: r for r in json.load(f)["results"]}
+    for result in results:
+        before = baseline.get(result["stage"])
+        if before is None:
+            continue
+        key = "median_ms" if "median_ms" in result else "median"
+        if before.get(key):
+            print(result["stage"], f"{(result[key] / before[key] - 1) * 100:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="cold starts to measure")
+    parser.add_argument("--output", default="startup_results.json", help="path of the JSON results")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    env = child_env()
+    # the first start also writes the bytecode caches, it is not measured
+    run_once(env)
+    runs = [run_once(env) for _ in range(args.runs)]
+
+    results = summarize(runs)
+    for result in results:
+        print(result)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "config": {"runs": args.runs, "python": sys.version.split()[0]},
+            "results": results,
+        }, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Gunicorn configuration for running the API in production.
+
+Usage (from src/backend):
+    gunicorn -c gunicorn.conf.py src.app:app
+
+Every worker process imports the app on its own (no preloading), so each worker gets
+its own pooled Supabase connections. The daily cleanup runs in exactly one worker,
+see start_scheduler() in src/app.py.
+"""
+
+import multiprocessing
+import os
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# worker processes and threads per worker process
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# every worker only sees its own writes (without SUPABASE_REALTIME_ENABLED),
+# so GET /listings?since= can not answer with complete deltas, see CHANGE_LOG_COMPLETE in src/app.py
+os.environ.setdefault("CHANGE_LOG_COMPLETE", "true" if workers == 1 else "false")
+
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+
+# "gevent" serves each connection with a greenlet, so open /listings/stream clients only cost
+# a waiting greenlet each and up to worker_connections clients are served per worker.
+# "gthread" serves each connection with one of `threads` threads of the worker.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+# every open /listings/stream client holds a thread of a gthread worker for as long as it is connected,
+# so there at most half of the threads may serve streams and the rest stays free for other requests
+if worker_class == "gthread":
+    max_stream_clients = max(threads // 2, 1)
+    os.environ["SSE_MAX_CLIENTS"] = str(min(int(os.environ.get("SSE_MAX_CLIENTS", max_stream_clients)), max_stream_clients))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    # scheduler, index build and realtime listener, once per worker process
+    from src.app import start_background_tasks
+    start_background_tasks()
@@ -1,26 +1,464 @@
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import base64
+import bisect
+import hashlib
+import heapq
+import io
+import itertools
+import shutil
+import tempfile
+import asyncio
+import fcntl
+import json
+import math
+import re
+import threading
+import time
+import uuid as uuidlib
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-from supabase import create_client, Client
-from flask import Flask, request
+import click
+import httpx
+from flask import Blueprint, Flask, current_app, g, has_request_context, request, Response, make_response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from rapidfuzz.fuzz import ratio
 
+# Supabase, numpy, rapidfuzz, Pillow and APScheduler are imported where they are used,
+# so importing this module (every worker boot, every test run) does not pay for them
+if TYPE_CHECKING:
+    from supabase import Client, AsyncClient
+    from PIL import Image
 
-from apscheduler.schedulers.background import BackgroundScheduler
+# brotli is optional, without it responses are compressed with gzip only
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 
-PORT: int = int(os.environ.get("PORT"))
+PORT: int = int(os.environ.get("PORT", "8000"))
 FRONTEND_ENDPOINT: str = os.environ.get("FRONTEND_ENDPOINT")
 
 SUPABASE_URL: str = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY: str = os.environ.get("SUPABASE_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Image downloads for list responses run concurrently, bounded by this many workers.
+# Each image download is bounded by this timeout (in seconds).
+IMAGE_FETCH_CONCURRENCY: int = int(os.environ.get("IMAGE_FETCH_CONCURRENCY", "8"))
+IMAGE_FETCH_TIMEOUT: float = float(os.environ.get("IMAGE_FETCH_TIMEOUT", "5"))
 
-app: Flask = Flask(__name__)
-CORS(app, origins=[FRONTEND_ENDPOINT])
+# Connections to Supabase shared by all threads of a process (table and storage requests),
+# every other Supabase request is bounded by SUPABASE_TIMEOUT (in seconds, the PostgREST default)
+SUPABASE_TIMEOUT: float = float(os.environ.get("SUPABASE_TIMEOUT", "120"))
+HTTP_MAX_CONNECTIONS: int = int(os.environ.get("HTTP_MAX_CONNECTIONS", "32"))
+HTTP_KEEPALIVE_EXPIRY: float = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "30"))
+# Run the Supabase requests of the listings endpoints on the async clients, see run_async()
+ASYNC_SUPABASE: bool = os.environ.get("ASYNC_SUPABASE", "false").lower() == "true"
+
+# JSON responses of at least COMPRESS_MIN_BYTES are compressed with brotli or gzip, as accepted by the client
+RESPONSE_COMPRESSION: bool = os.environ.get("RESPONSE_COMPRESSION", "true").lower() == "true"
+COMPRESS_MIN_BYTES: int = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL: int = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY: int = int(os.environ.get("BROTLI_QUALITY", "5"))
+
+# Streamed GET /listings (stream=json|ndjson): rows read per database request, images downloaded
+# ahead of the listing being sent, and bytes collected before a chunk is sent
+STREAM_PAGE_SIZE: int = int(os.environ.get("STREAM_PAGE_SIZE", "200"))
+STREAM_IMAGE_WINDOW: int = int(os.environ.get("STREAM_IMAGE_WINDOW", str(IMAGE_FETCH_CONCURRENCY * 2)))
+STREAM_CHUNK_BYTES: int = int(os.environ.get("STREAM_CHUNK_BYTES", str(64 * 1024)))
+
+# Request and Supabase metrics served by GET /metrics (Prometheus text format).
+# With SERVER_TIMING, responses carry the time spent per phase in a Server-Timing header.
+METRICS_ENABLED: bool = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+SERVER_TIMING: bool = os.environ.get("SERVER_TIMING", "false").lower() == "true"
+
+# Only the process holding this lock file runs the daily cleanup, see start_scheduler()
+SCHEDULER_LOCK_FILE: str = os.environ.get("SCHEDULER_LOCK_FILE", "/tmp/fundus-scheduler.lock")
+
+# Retention job: listings older than RETENTION_DAYS are deleted daily in batches of RETENTION_BATCH_SIZE,
+# failed Supabase requests are retried RETENTION_RETRIES times (waiting RETENTION_RETRY_DELAY seconds,
+# doubled per retry). With RETENTION_DRY_RUN scheduled runs only count what they would delete.
+RETENTION_DAYS: int = int(os.environ.get("RETENTION_DAYS", "14"))
+RETENTION_BATCH_SIZE: int = int(os.environ.get("RETENTION_BATCH_SIZE", "100"))
+RETENTION_RETRIES: int = int(os.environ.get("RETENTION_RETRIES", "3"))
+RETENTION_RETRY_DELAY: float = float(os.environ.get("RETENTION_RETRY_DELAY", "1"))
+RETENTION_DRY_RUN: bool = os.environ.get("RETENTION_DRY_RUN", "false").lower() == "true"
+# Hours between sweeps for images without listing, and min. age in seconds of a swept image
+# (images are uploaded before the row of their listing is inserted)
+ORPHAN_SWEEP_INTERVAL_HOURS: float = float(os.environ.get("ORPHAN_SWEEP_INTERVAL_HOURS", "24"))
+ORPHAN_GRACE_SECONDS: int = int(os.environ.get("ORPHAN_GRACE_SECONDS", "3600"))
+# Number of retention and sweep runs kept for GET /retention/stats
+RETENTION_HISTORY_SIZE: int = int(os.environ.get("RETENTION_HISTORY_SIZE", "50"))
+
+# Raw image responses may be cached by browsers for this many seconds (revalidated via ETag afterwards)
+IMAGE_CACHE_MAX_AGE: int = int(os.environ.get("IMAGE_CACHE_MAX_AGE", "86400"))
+# Maximum number of listings per page for paginated GET /listings requests
+LISTINGS_MAX_PAGE_SIZE: int = int(os.environ.get("LISTINGS_MAX_PAGE_SIZE", "100"))
+# Maximum width/height in pixels of thumbnails
+THUMBNAIL_SIZE: int = int(os.environ.get("THUMBNAIL_SIZE", "256"))
+
+# Uploaded images: max. size in bytes and in pixels, max. width/height in pixels of the stored
+# display image, encoding of stored images ("WEBP" or "PNG") and WebP quality (0-100)
+IMAGE_MAX_BYTES: int = int(os.environ.get("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_MAX_PIXELS: int = int(os.environ.get("IMAGE_MAX_PIXELS", str(40_000_000)))
+IMAGE_DISPLAY_SIZE: int = int(os.environ.get("IMAGE_DISPLAY_SIZE", "1280"))
+IMAGE_FORMAT: str = os.environ.get("IMAGE_FORMAT", "WEBP").upper()
+IMAGE_QUALITY: int = int(os.environ.get("IMAGE_QUALITY", "80"))
+# Uploaded images processed at the same time per process, bounds the memory used for decoding
+IMAGE_INGEST_CONCURRENCY: int = int(os.environ.get("IMAGE_INGEST_CONCURRENCY", "2"))
+# Maximum size in bytes of a request body, larger requests are rejected with 413 before they are read.
+# The default leaves room for a base64 encoded image of IMAGE_MAX_BYTES inside a JSON body.
+MAX_REQUEST_BYTES: int = int(os.environ.get("MAX_REQUEST_BYTES", str(IMAGE_MAX_BYTES * 4 // 3 + 1024 * 1024)))
+# Uploaded image bodies up to this size in bytes are buffered in memory, larger ones in a temporary file
+IMAGE_SPOOL_MEMORY: int = int(os.environ.get("IMAGE_SPOOL_MEMORY", str(1024 * 1024)))
+
+# Threads used by rapidfuzz to score titles of a duplicate check (-1 = all cores)
+DUPLICATE_CHECK_WORKERS: int = int(os.environ.get("DUPLICATE_CHECK_WORKERS", "-1"))
+# Maximum number of drafts per POST /listings/duplicates:check request
+DUPLICATE_CHECK_MAX_BATCH: int = int(os.environ.get("DUPLICATE_CHECK_MAX_BATCH", "500"))
+# Maximum number of listings per POST /listings:batch and DELETE /listings:batch request
+LISTINGS_MAX_BATCH: int = int(os.environ.get("LISTINGS_MAX_BATCH", "100"))
+
+# Lost-vs-found matching: weights of the combined score, max. age difference in days that
+# still counts as close in time, max. candidates scored per query and max. k per request
+MATCH_WEIGHTS: dict = {"title": 0.45, "description": 0.15, "category": 0.2, "room": 0.1, "time": 0.1}
+MATCH_TIME_WINDOW_DAYS: int = int(os.environ.get("MATCH_TIME_WINDOW_DAYS", "14"))
+MATCH_MAX_CANDIDATES: int = int(os.environ.get("MATCH_MAX_CANDIDATES", "200"))
+MATCH_MAX_K: int = int(os.environ.get("MATCH_MAX_K", "50"))
+MATCH_CACHE_SIZE: int = int(os.environ.get("MATCH_CACHE_SIZE", "10000"))
+# Seconds after which the search and matching index is synced with the table again (in the background),
+# so listings created or deleted by other processes show up or disappear; 0 disables the resync
+INDEX_RESYNC_INTERVAL: float = float(os.environ.get("INDEX_RESYNC_INTERVAL", "60"))
+
+# Full-text search: min. rapidfuzz ratio (0-100) for a typo-tolerant term match and
+# max. number of similar index terms tried per unknown search word
+SEARCH_FUZZY_CUTOFF: float = float(os.environ.get("SEARCH_FUZZY_CUTOFF", "80"))
+SEARCH_FUZZY_EXPANSIONS: int = int(os.environ.get("SEARCH_FUZZY_EXPANSIONS", "5"))
+
+# Number of creations/deletions kept for GET /listings?since=<version>, and number of
+# content versions remembered for Last-Modified / If-Modified-Since
+CHANGE_LOG_SIZE: int = int(os.environ.get("CHANGE_LOG_SIZE", "10000"))
+CONTENT_VERSIONS_SIZE: int = int(os.environ.get("CONTENT_VERSIONS_SIZE", "10000"))
+
+# Server-Sent Events change feed: max. connected clients per process, seconds between
+# heartbeats and max. number of changes a client may lag behind before it is disconnected.
+# A client holds a greenlet of a gevent worker, with gthread workers a thread (gunicorn.conf.py then caps
+# the clients at half the threads).
+SSE_MAX_CLIENTS: int = int(os.environ.get("SSE_MAX_CLIENTS", "1000"))
+SSE_HEARTBEAT_INTERVAL: float = float(os.environ.get("SSE_HEARTBEAT_INTERVAL", "15"))
+SSE_MAX_LAG: int = int(os.environ.get("SSE_MAX_LAG", "1000"))
+# Also apply changes made by other processes, received via Supabase Realtime
+SUPABASE_REALTIME_ENABLED: bool = os.environ.get("SUPABASE_REALTIME_ENABLED", "false").lower() == "true"
+# The change log only sees the writes of this process, and those of other processes with Realtime.
+# Set to false if several processes write without Realtime (gunicorn.conf.py does for several workers),
+# GET /listings?since= and GET /listings/stream then answer 410 instead of missing the changes of other processes.
+CHANGE_LOG_COMPLETE: bool = SUPABASE_REALTIME_ENABLED or os.environ.get("CHANGE_LOG_COMPLETE", "true").lower() == "true"
+
+# In-process cache for listing rows and image bytes.
+# Writes of this process update the cache directly, the TTL (in seconds) bounds staleness
+# caused by writes of other processes.
+CACHE_ENABLED: bool = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
+CACHE_TTL: float = float(os.environ.get("CACHE_TTL", "30"))
+# Expired listing rows and query results are still served for CACHE_STALE_TTL seconds,
+# while a single background request per entry refreshes them (stale-while-revalidate)
+CACHE_STALE_TTL: float = float(os.environ.get("CACHE_STALE_TTL", "10"))
+CACHE_REFRESH_CONCURRENCY: int = int(os.environ.get("CACHE_REFRESH_CONCURRENCY", "4"))
+IMAGE_CACHE_MAX_BYTES: int = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Max. number of cached image paths, bounds the entries recording a missing image (they have no size)
+IMAGE_CACHE_MAX_ENTRIES: int = int(os.environ.get("IMAGE_CACHE_MAX_ENTRIES", "10000"))
+# Max. number of cached listing rows and GET /listings query results, least recently used are evicted first
+CACHE_MAX_ROWS: int = int(os.environ.get("CACHE_MAX_ROWS", "10000"))
+CACHE_MAX_QUERIES: int = int(os.environ.get("CACHE_MAX_QUERIES", "500"))
+
+class Metrics:
+    """
+    Process-local counters and histograms, rendered in the Prometheus text format.
+    
+    Every worker process counts on its own (like the caches), so Prometheus scrapes the
+    processes separately or sums over them. Recording a value is one dict update under a
+    lock, cheap enough to stay enabled in production.
+    
+    Parameters
+    ----------
+    enabled : bool
+        If False, nothing is recorded.
+    """
+    
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        # name -> (type, help, buckets, {labels -> value}), histogram values are
+        # [count per bucket..., count above the last bucket, sum]
+        self.families = {}
+        self.lock = threading.Lock()
+    
+    def counter(self, name: str, help: str):
+        self.families[name] = ("counter", help, None, {})
+    
+    def histogram(self, name: str, help: str, buckets: tuple):
+        self.families[name] = ("histogram", help, buckets, {})
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        series = self.families[name][3]
+        with self.lock:
+            series[key] = series.get(key, 0) + value
+    
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        _, _, buckets, series = self.families[name]
+        with self.lock:
+            values = series.get(key)
+            if values is None:
+                values = series[key] = [0] * (len(buckets) + 2)
+            values[bisect.bisect_left(buckets, value)] += 1
+            values[-1] += value
+    
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (kind, help, buckets, series) in self.families.items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, values in series.items():
+                    if kind == "counter":
+                        lines.append(f"{name}{format_labels(key)} {values}")
+                        continue
+                    count = 0
+                    for le, bucket_count in zip([*buckets, "+Inf"], values):
+                        count += bucket_count
+                        lines.append(f"{name}_bucket{format_labels(key + (('le', le),))} {count}")
+                    lines.append(f"{name}_sum{format_labels(key)} {values[-1]}")
+                    lines.append(f"{name}_count{format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# formats label pairs as {name="value",...} of the Prometheus text format
+def format_labels(key: tuple):
+    if not key:
+        return ""
+    pairs = []
+    for name, value in key:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+LATENCY_BUCKETS: tuple = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS: tuple = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+metrics: Metrics = Metrics(enabled=METRICS_ENABLED)
+metrics.histogram("http_request_duration_seconds", "Latency of HTTP requests by route", LATENCY_BUCKETS)
+metrics.histogram("http_request_phase_seconds", "Time spent per phase of HTTP requests by route", LATENCY_BUCKETS)
+metrics.histogram("http_request_size_bytes", "Size of HTTP request bodies by route", SIZE_BUCKETS)
+metrics.histogram("http_response_size_bytes", "Size of HTTP response bodies by route (streamed responses excluded)", SIZE_BUCKETS)
+metrics.counter("http_errors_total", "HTTP error responses by route, status and error message")
+metrics.histogram("supabase_request_duration_seconds", "Latency of Supabase requests until the response headers arrived", LATENCY_BUCKETS)
+metrics.histogram("supabase_request_size_bytes", "Size of Supabase request bodies", SIZE_BUCKETS)
+metrics.histogram("supabase_response_size_bytes", "Size of Supabase response bodies", SIZE_BUCKETS)
+metrics.counter("supabase_errors_total", "Failed Supabase requests by cause (exception or HTTP status)")
+metrics.counter("duplicate_comparisons_total", "Listing pairs compared by the duplicate check")
+metrics.counter("duplicate_matches_total", "Listing pairs found to be potential duplicates")
+
+# operation of a Supabase request by HTTP method
+TABLE_OPERATIONS: dict = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+STORAGE_OPERATIONS: dict = {"GET": "download", "HEAD": "exists", "POST": "upload", "PUT": "upload", "DELETE": "remove"}
+
+
+# (service, operation) of a Supabase request, service is "table", "storage" or "other"
+def supabase_operation(request: httpx.Request):
+    path = request.url.path
+    if path.startswith("/rest/v1/"):
+        return "table", TABLE_OPERATIONS.get(request.method, request.method.lower())
+    if path.startswith("/storage/v1/object/list/"):
+        return "storage", "list"
+    if path.startswith("/storage/v1/"):
+        return "storage", STORAGE_OPERATIONS.get(request.method, request.method.lower())
+    return "other", request.method.lower()
+
+
+# bounds image downloads by IMAGE_FETCH_TIMEOUT instead of the client's SUPABASE_TIMEOUT,
+# a slow image is left out of a list response rather than holding it up
+def apply_download_timeout(request: httpx.Request):
+    if supabase_operation(request) == ("storage", "download"):
+        request.extensions["timeout"] = httpx.Timeout(IMAGE_FETCH_TIMEOUT).as_dict()
+
+
+# records latency, sizes and failures of a finished Supabase request, returns its service
+def record_supabase_request(request: httpx.Request, seconds: float, response: httpx.Response | None = None, error: Exception | None = None):
+    service, operation = supabase_operation(request)
+    metrics.observe("supabase_request_duration_seconds", seconds, service=service, operation=operation)
+    if request.headers.get("content-length"):
+        metrics.observe("supabase_request_size_bytes", int(request.headers["content-length"]), service=service, operation=operation)
+    if error is not None:
+        metrics.inc("supabase_errors_total", service=service, operation=operation, cause=type(error).__name__)
+    else:
+        if response.headers.get("content-length"):
+            metrics.observe("supabase_response_size_bytes", int(response.headers["content-length"]), service=service, operation=operation)
+        if response.status_code >= 400:
+            metrics.inc("supabase_errors_total", service=service, operation=operation, cause=f"http_{response.status_code}")
+    return service
+
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    """
+    HTTP transport of the Supabase client recording every request, see record_supabase_request().
+    Requests made on the request thread also count towards its "db" or "storage" phase.
+    Image downloads get their own timeout, see apply_download_timeout().
+    """
+    
+    def handle_request(self, request: httpx.Request):
+        apply_download_timeout(request)
+        start = time.perf_counter()
+        try:
+            response = super().handle_request(request)
+        except Exception as e:
+            service = record_supabase_request(request, time.perf_counter() - start, error=e)
+            record_timing("db" if service == "table" else service, time.perf_counter() - start)
+            raise
+        service = record_supabase_request(request, time.perf_counter() - start, response)
+        record_timing("db" if service == "table" else service, time.perf_counter() - start)
+        return response
+
+
+class AsyncInstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    HTTP transport of the async Supabase client, see InstrumentedTransport.
+    
+    Its requests run concurrently on the event loop, the request thread times its wait
+    for them instead, see run_async().
+    """
+    
+    async def handle_async_request(self, request: httpx.Request):
+        apply_download_timeout(request)
+        start = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except Exception as e:
+            record_supabase_request(request, time.perf_counter() - start, error=e)
+            raise
+        record_supabase_request(request, time.perf_counter() - start, response)
+        return response
+
+
+# measures the time spent in a phase of the current request, see record_timing()
+@contextmanager
+def timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, time.perf_counter() - start)
+
+
+# adds time to a phase of the current request ("db", "storage", "b64", "json", ...).
+# Outside of a request (background threads, event loop) nothing is recorded.
+def record_timing(phase: str, seconds: float):
+    if not has_request_context():
+        return
+    timings = g.setdefault("timings", {})
+    timings[phase] = timings.get(phase, 0) + seconds
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider of the app, counts serializing JSON responses as "json" phase of the request.
+    """
+    
+    def response(self, *args, **kwargs):
+        with timed("json"):
+            return super().response(*args, **kwargs)
+
+
+http_limits: httpx.Limits = httpx.Limits(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+)
+
+
+class LazyClient:
+    """
+    Stand-in for a client that is created on first use, by the first attribute access.
+    
+    Creating the Supabase client imports the supabase package and sets up TLS for its
+    connection pool, which takes most of the startup time of a worker. Deferring it keeps
+    importing this module fast and independent of credentials.
+    
+    Parameters
+    ----------
+    create : callable
+        Returns the client, called at most once.
+    """
+    
+    def __init__(self, create):
+        self.create = create
+        self.client = None
+        self.lock = threading.Lock()
+    
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+    
+    def get(self):
+        """Return the client, create it if this is the first use."""
+        
+        if self.client is None:
+            with self.lock:
+                if self.client is None:
+                    self.client = self.create()
+        return self.client
+
+
+# creates the Supabase client on first use, see LazyClient
+def create_supabase():
+    from supabase import create_client, ClientOptions
+    
+    # one pooled HTTP/2 client behind table, storage and auth requests, so connections are reused
+    http_client = httpx.Client(
+        timeout=SUPABASE_TIMEOUT,
+        transport=InstrumentedTransport(http2=True, limits=http_limits)
+    )
+    return create_client(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        options=ClientOptions(httpx_client=http_client)
+    )
+
+
+supabase: "Client" = LazyClient(create_supabase)
+
+image_fetch_pool: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=IMAGE_FETCH_CONCURRENCY,
+    thread_name_prefix="image-fetch"
+)
+
+image_ingest_pool: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=IMAGE_INGEST_CONCURRENCY,
+    thread_name_prefix="image-ingest"
+)
+
+cache_refresh_pool: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=CACHE_REFRESH_CONCURRENCY,
+    thread_name_prefix="cache-refresh"
+)
+
+# Async request path (ASYNC_SUPABASE): one event loop per process runs in a background thread,
+# started on first use together with the async Supabase client it owns
+async_loop: asyncio.AbstractEventLoop | None = None
+async_supabase: "AsyncClient | None" = None
+async_loop_lock: threading.Lock = threading.Lock()
+
+# routes and hooks of the API, registered on the app by create_app()
+api: Blueprint = Blueprint("api", __name__, cli_group=None)
 
 # Synonym dictionary for duplicate detection
 SYNONYMS = {
@@ -63,13 +501,883 @@ SYNONYMS = {
     "flasche": ["trinkflasche"]
 }
 
+# SYNONYMS as word -> frozenset of its synonyms, built once at import for the lookups
+# of duplicate detection and search
+SYNONYM_LOOKUP: dict = {word: frozenset(synonyms) for word, synonyms in SYNONYMS.items()}
+
+
+class ListingsCache:
+    """
+    Process-local cache for rows of the "listings" table.
+    
+    Holds single rows by uuid and the results of GET /listings queries by their parsed
+    query parameters, both expiring after `ttl` seconds. Expired entries are still returned
+    for `stale_ttl` more seconds, flagged as stale, so readers can serve them while the entry
+    is refreshed, and purged when looked up afterwards. Rows and query results are LRU caches
+    bounded by `max_rows` and `max_queries`. Writes update or invalidate exactly the affected
+    entries via `put_row` and `remove_rows`.
+    
+    Parameters
+    ----------
+    ttl : float
+        Seconds after which an entry is considered stale.
+    enabled : bool
+        If False, every lookup is a miss and nothing is stored.
+    stale_ttl : float
+        Seconds after `ttl` during which a stale entry is still returned.
+    max_rows : int
+        Max. number of cached rows.
+    max_queries : int
+        Max. number of cached query results.
+    """
+    
+    def __init__(self, ttl: float, enabled: bool = True, stale_ttl: float = 0, max_rows: int = 10000, max_queries: int = 500):
+        self.ttl = ttl
+        self.enabled = enabled
+        self.stale_ttl = stale_ttl
+        self.max_rows = max_rows
+        self.max_queries = max_queries
+        self.rows = OrderedDict()       # uuid -> (expires_at, row)
+        self.queries = OrderedDict()    # query key -> (expires_at, listings_query, rows)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # incremented by every write, results read before a write are not stored after it
+        self.generation = 0
+        self.lock = threading.Lock()
+    
+    # returns (value, stale) for the entry of `key`, value is None if missing or expired for too long
+    def _lookup(self, entries: OrderedDict, key, value_index: int):
+        now = time.monotonic()
+        entry = entries.get(key)
+        if entry is not None and entry[0] + self.stale_ttl < now:
+            # expired for too long, drop it instead of keeping it until it is overwritten
+            del entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None, False
+        entries.move_to_end(key)
+        if entry[0] < now:
+            self.stale_hits += 1
+            return entry[value_index], True
+        self.hits += 1
+        return entry[value_index], False
+    
+    def get_row(self, uuid: str):
+        with self.lock:
+            row, stale = self._lookup(self.rows, uuid, 1)
+            return (dict(row) if row is not None else None), stale
+    
+    def get_query(self, listings_query: dict):
+        with self.lock:
+            rows, stale = self._lookup(self.queries, query_key(listings_query), 2)
+            return ([dict(row) for row in rows] if rows is not None else None), stale
+    
+    def put_query(self, listings_query: dict, rows: list, generation: int | None = None):
+        """
+        Store the rows of a query. If `generation` is given, the rows are only stored if
+        there was no write since `generation` was read.
+        """
+        
+        if not self.enabled:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            expires_at = time.monotonic() + self.ttl
+            self._store(self.queries, query_key(listings_query), (expires_at, listings_query, [dict(row) for row in rows]), self.max_queries)
+            for row in rows:
+                self._store(self.rows, row["uuid"], (expires_at, dict(row)), self.max_rows)
+    
+    def put_row(self, row: dict, generation: int | None = None):
+        """
+        Store a new or changed row and drop every cached query result it could belong to.
+        Rows read from the database pass the `generation` read before, see put_query(),
+        and leave cached query results alone, those expire on their own.
+        """
+        
+        if not self.enabled:
+            return
+        with self.lock:
+            if generation is not None:
+                if generation == self.generation:
+                    self._store(self.rows, row["uuid"], (time.monotonic() + self.ttl, dict(row)), self.max_rows)
+                return
+            self.generation += 1
+            self._store(self.rows, row["uuid"], (time.monotonic() + self.ttl, dict(row)), self.max_rows)
+            for key, (_, listings_query, _) in list(self.queries.items()):
+                if listing_matches_query(row, listings_query):
+                    del self.queries[key]
+                    self.evictions += 1
+    
+    def remove_rows(self, uuids):
+        """
+        Drop the given rows and every cached query result containing one of them.
+        """
+        
+        uuids = set(uuids)
+        with self.lock:
+            self.generation += 1
+            for uuid in uuids:
+                if self.rows.pop(uuid, None) is not None:
+                    self.evictions += 1
+            for key, (_, _, rows) in list(self.queries.items()):
+                if any(row["uuid"] in uuids for row in rows):
+                    del self.queries[key]
+                    self.evictions += 1
+    
+    # stores an entry as most recently used and evicts the least recently used beyond `max_size`
+    def _store(self, entries: OrderedDict, key, entry: tuple, max_size: int):
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > max_size:
+            entries.popitem(last=False)
+            self.evictions += 1
+    
+    def uuids_created_before(self, cutoff: str):
+        with self.lock:
+            rows = [row for _, row in self.rows.values()]
+            rows.extend(row for _, _, query_rows in self.queries.values() for row in query_rows)
+            return {row["uuid"] for row in rows if str(row.get("created_at")) < cutoff}
+    
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.rows.clear()
+            self.queries.clear()
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "rows": len(self.rows),
+                "queries": len(self.queries),
+            }
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one call.
+    
+    The first caller of a key runs the call, every caller arriving while it is in flight
+    waits for it and gets the same result (or exception). Used for reads from Supabase,
+    so a burst of identical requests causes one upstream request instead of one per client.
+    Calls from the async request path (ASYNC_SUPABASE) run on the event loop, see do_async().
+    """
+    
+    def __init__(self):
+        self.calls = {}         # key -> Future of the call in flight
+        self.async_calls = {}   # key -> asyncio.Task of the call in flight, only used on the event loop
+        self.calls_started = 0
+        self.calls_shared = 0
+        self.refreshes = 0
+        self.lock = threading.Lock()
+    
+    def do(self, key, fn, *args):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+                self.calls_started += 1
+            else:
+                self.calls_shared += 1
+        if leader:
+            self._run(key, future, fn, args)
+            return future.result()
+        with timed("shared"):
+            return future.result()
+    
+    def refresh(self, key, fn, *args):
+        """
+        Run the call in the background, unless a call for the key is already in flight.
+        """
+        
+        with self.lock:
+            if key in self.calls:
+                return
+            future = self.calls[key] = Future()
+            self.calls_started += 1
+            self.refreshes += 1
+        cache_refresh_pool.submit(self._run, key, future, fn, args)
+    
+    def _run(self, key, future: Future, fn, args):
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.calls[key]
+    
+    async def do_async(self, key, fn, *args):
+        task = self.async_calls.get(key)
+        if task is None:
+            task = self.async_calls[key] = asyncio.ensure_future(fn(*args))
+            task.add_done_callback(lambda _: self.async_calls.pop(key, None))
+            with self.lock:
+                self.calls_started += 1
+        else:
+            with self.lock:
+                self.calls_shared += 1
+        # a cancelled waiter must not cancel the call of the other waiters
+        return await asyncio.shield(task)
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "in_flight": len(self.calls) + len(self.async_calls),
+                "started": self.calls_started,
+                "shared": self.calls_shared,
+                "refreshes": self.refreshes,
+            }
+
+
+class ImageCache:
+    """
+    Process-local LRU cache for image bytes by listing uuid, bounded by total size
+    and number of entries.
+    
+    A cached value of None records that a listing has no image, so listings without
+    images do not cause a storage request on every read either.
+    
+    Parameters
+    ----------
+    max_bytes : int
+        Upper bound for the summed size of all cached images.
+    max_entries : int
+        Upper bound for the number of cached paths, including those without an image.
+    ttl : float
+        Seconds after which an entry is considered stale.
+    enabled : bool
+        If False, every lookup is a miss and nothing is stored.
+    """
+    
+    MISSING = object()
+    
+    def __init__(self, max_bytes: int, ttl: float, enabled: bool = True, max_entries: int = IMAGE_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.images = OrderedDict()     # storage path -> (expires_at, bytes | None)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+    
+    def get(self, path: str):
+        """
+        Return the cached image bytes (or None if there is no image at this path),
+        or ImageCache.MISSING if nothing usable is cached.
+        """
+        
+        with self.lock:
+            entry = self.images.get(path)
+            if entry is not None and entry[0] < time.monotonic():
+                # expired, drop it instead of keeping it until it is overwritten
+                self._pop(path)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return ImageCache.MISSING
+            self.images.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, path: str, image_bin: bytes | None, immutable: bool = False):
+        """
+        Cache the image bytes at a storage path (None: there is no image). Immutable
+        (content-addressed) images never expire, they are only evicted by size.
+        """
+        
+        if not self.enabled or (image_bin is not None and len(image_bin) > self.max_bytes):
+            return
+        expires_at = math.inf if immutable and image_bin is not None else time.monotonic() + self.ttl
+        with self.lock:
+            self._pop(path)
+            self.images[path] = (expires_at, image_bin)
+            self.size += len(image_bin or b"")
+            # evict least recently used images until both bounds hold again
+            while self.size > self.max_bytes or len(self.images) > self.max_entries:
+                self._pop(next(iter(self.images)))
+                self.evictions += 1
+    
+    def remove(self, paths):
+        with self.lock:
+            for path in paths:
+                if self._pop(path):
+                    self.evictions += 1
+    
+    def clear(self):
+        with self.lock:
+            self.images.clear()
+            self.size = 0
+    
+    def _pop(self, path: str):
+        entry = self.images.pop(path, None)
+        if entry is None:
+            return False
+        self.size -= len(entry[1] or b"")
+        return True
+    
+    def stats(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "images": len(self.images),
+                "bytes": self.size,
+            }
+
+
+class ListingsIndex:
+    """
+    In-memory index over all listings, built from the table once on first use and
+    then maintained incrementally by `add` and `remove` on every write of this process.
+    Writes of other processes are picked up by `resync`, started by `ensure_built` once
+    the index is older than INDEX_RESYNC_INTERVAL.
+    
+    Keeps a precomputed entry per listing (lowercased texts, synonym-expanded terms,
+    parsed date) and posting lists from (type, term) and (type, category, room) to uuids,
+    so candidates for a listing or a search are found without scanning all listings.
+    Also caches ranked lost-vs-found matches per listing until a relevant listing changes.
+    """
+    
+    def __init__(self, match_cache_size: int):
+        self.ready = False
+        self.entries = {}               # uuid -> entry
+        self.term_postings = {}         # (type, term) -> set of uuids
+        self.title_postings = {}        # (type, term) -> set of uuids having the term in their title
+        self.bucket_postings = {}       # (type, category, room) -> set of uuids
+        self.vocabulary = {}            # term -> number of (type, term) posting lists
+        self.vocabulary_list = None     # terms of the vocabulary for fuzzy lookups, rebuilt on change
+        self.types = set()
+        self.matches = OrderedDict()    # uuid -> ranked [(uuid, score), ...]
+        self.match_cache_size = match_cache_size
+        self.lock = threading.RLock()
+        self.synced_at = 0.0            # time.monotonic() of the last build or resync
+        self.resyncing = False
+        self.touched = None             # uuids written by this process while a resync reads the table
+        # incremented by every change, matches ranked before a change are not stored after it
+        self.generation = 0
+    
+    def ensure_built(self):
+        if self.ready:
+            if INDEX_RESYNC_INTERVAL and time.monotonic() - self.synced_at > INDEX_RESYNC_INTERVAL:
+                self.start_resync()
+            return
+        with self.lock:
+            if not self.ready:
+                for row in load_all_listings():
+                    self._add(row)
+                self.synced_at = time.monotonic()
+                self.ready = True
+    
+    def start_resync(self):
+        """Start `resync` in the background, unless one is already running."""
+        
+        with self.lock:
+            if self.resyncing:
+                return
+            self.resyncing = True
+        cache_refresh_pool.submit(self.resync)
+    
+    def resync(self):
+        """
+        Sync the index with the table: add listings created (or changed) and remove listings
+        deleted by other processes. Only uuid and image_hash (the one column written after
+        creation) of all rows are read, full rows only for new or changed listings. The table
+        is read without holding the lock, listings this process writes in the meantime are
+        already up to date and left alone.
+        """
+        
+        with self.lock:
+            self.resyncing = True
+            self.touched = set()
+            known = {uuid: entry["row"].get("image_hash") for uuid, entry in self.entries.items()}
+        try:
+            versions = {row["uuid"]: row.get("image_hash") for row in load_all_listings(columns="uuid,image_hash")}
+            changed = [uuid for uuid, image_hash in versions.items() if uuid not in known or known[uuid] != image_hash]
+            rows = load_listings(changed)
+            with self.lock:
+                touched, self.touched = self.touched, None
+                self.remove([uuid for uuid in self.entries if uuid not in versions and uuid not in touched])
+                for row in rows:
+                    if row["uuid"] not in touched:
+                        self.add(row)
+        except Exception as e:
+            print(f"[ERROR] {datetime.now().isoformat()} : Resync of the listings index failed: {e}")
+        finally:
+            with self.lock:
+                self.touched = None
+                self.resyncing = False
+                # also after a failure, so a failing table is not read again on every request
+                self.synced_at = time.monotonic()
+    
+    def add(self, row: dict):
+        with self.lock:
+            if not self.ready:
+                # not built yet, the row will be read on build
+                return
+            if self.touched is not None:
+                self.touched.add(row["uuid"])
+            self._add(row)
+            entry = self.entries[row["uuid"]]
+            # invalidate cached matches the new listing could be part of
+            for uuid in list(self.matches):
+                other = self.entries.get(uuid)
+                if other is None or is_match_candidate(other, entry):
+                    del self.matches[uuid]
+    
+    def remove(self, uuids):
+        uuids = set(uuids)
+        with self.lock:
+            if self.touched is not None:
+                self.touched.update(uuids)
+            for uuid in uuids:
+                entry = self.entries.pop(uuid, None)
+                if entry is None:
+                    continue
+                self.generation += 1
+                for term in entry["terms"]:
+                    self._discard(self.term_postings, (entry["type"], term), uuid)
+                    self._discard(self.title_postings, (entry["type"], term), uuid)
+                    if (entry["type"], term) not in self.term_postings:
+                        self.vocabulary[term] -= 1
+                        if not self.vocabulary[term]:
+                            del self.vocabulary[term]
+                            self.vocabulary_list = None
+                self._discard(self.bucket_postings, (entry["type"], entry["category"], entry["room"]), uuid)
+            # invalidate cached matches of and containing removed listings
+            for uuid, ranked in list(self.matches.items()):
+                if uuid in uuids or any(match_uuid in uuids for match_uuid, _ in ranked):
+                    del self.matches[uuid]
+    
+    def uuids_created_before(self, cutoff: str):
+        with self.lock:
+            return {uuid for uuid, entry in self.entries.items() if entry["created_at"] < cutoff}
+    
+    def candidates(self, entry: dict, type: str, limit: int):
+        """
+        Return up to `limit` uuids of listings of the given type that share the most
+        terms with `entry`, filled up with listings of the same category and room.
+        """
+        
+        counts = {}
+        for term in entry["terms"]:
+            postings = self.term_postings.get((type, term), ())
+            # very common terms hardly tell listings apart, skip them
+            if len(postings) > limit * 10:
+                continue
+            for uuid in postings:
+                counts[uuid] = counts.get(uuid, 0) + 1
+        
+        if len(counts) > limit:
+            return heapq.nlargest(limit, counts, key=counts.get)
+        
+        for uuid in self.bucket_postings.get((type, entry["category"], entry["room"]), ()):
+            if len(counts) >= limit:
+                break
+            counts.setdefault(uuid, 0)
+        return list(counts)
+    
+    def search(self, query: str, limit: int):
+        """
+        Return the number of listings matching the search words and (uuid, score)
+        of the best `limit` of them, best first.
+        
+        Every search word matches index terms exactly, via its synonyms (weight 0.9) or,
+        if the word itself is not in the index, via similar terms found with rapidfuzz
+        (weight 0.8 x similarity). Per word the best weight counts, doubled if the term
+        occurs in the title. A listing's score is the sum over all search words.
+        """
+        
+        from rapidfuzz.fuzz import ratio
+        from rapidfuzz.process import extract
+        
+        with self.lock:
+            scores = {}
+            for word in dict.fromkeys(normalize_words(query)):
+                weights = {word: 1.0}
+                for synonym in SYNONYM_LOOKUP.get(word, ()):
+                    weights.setdefault(synonym, 0.9)
+                if word not in self.vocabulary:
+                    if self.vocabulary_list is None:
+                        self.vocabulary_list = list(self.vocabulary)
+                    for term, similarity, _ in extract(
+                        word, self.vocabulary_list, scorer=ratio,
+                        score_cutoff=SEARCH_FUZZY_CUTOFF, limit=SEARCH_FUZZY_EXPANSIONS
+                    ):
+                        weights.setdefault(term, 0.8 * similarity / 100)
+                
+                # posting lists by descending weight, so every listing gets the best weight of this word
+                weighted_postings = []
+                for term, weight in weights.items():
+                    for type in self.types:
+                        weighted_postings.append((weight * 2, self.title_postings.get((type, term), set())))
+                        weighted_postings.append((weight, self.term_postings.get((type, term), set())))
+                weighted_postings.sort(key=lambda weighted: weighted[0], reverse=True)
+                
+                word_scores = {}
+                for weight, postings in weighted_postings:
+                    word_scores.update(dict.fromkeys(postings.difference(word_scores), weight))
+                
+                if not scores:
+                    scores = word_scores
+                else:
+                    for uuid, score in word_scores.items():
+                        scores[uuid] = scores.get(uuid, 0) + score
+            
+            if not scores:
+                return 0, []
+            
+            # best `limit` scores, newer listings first among equal scores at the cut
+            threshold = heapq.nlargest(limit, scores.values())[-1]
+            ranked = [(uuid, score) for uuid, score in scores.items() if score > threshold]
+            ties = [uuid for uuid, score in scores.items() if score == threshold]
+            ties = heapq.nlargest(limit - len(ranked), ties, key=lambda uuid: self.entries[uuid]["created_at"])
+            ranked.extend((uuid, threshold) for uuid in ties)
+            ranked.sort(key=lambda match: (match[1], self.entries[match[0]]["created_at"]), reverse=True)
+            return len(scores), ranked
+    
+    def get_matches(self, uuid: str):
+        with self.lock:
+            ranked = self.matches.get(uuid)
+            if ranked is not None:
+                self.matches.move_to_end(uuid)
+            return ranked
+    
+    def put_matches(self, uuid: str, ranked: list, generation: int | None = None):
+        """
+        Store the ranked matches of a listing. If `generation` is given, they are only
+        stored if the index did not change since `generation` was read.
+        """
+        
+        with self.lock:
+            if uuid not in self.entries or (generation is not None and generation != self.generation):
+                return
+            self.matches[uuid] = ranked
+            while len(self.matches) > self.match_cache_size:
+                self.matches.popitem(last=False)
+    
+    def _add(self, row: dict):
+        if row["uuid"] in self.entries:
+            self.remove([row["uuid"]])
+        self.generation += 1
+        entry = index_entry(row)
+        self.entries[entry["uuid"]] = entry
+        self.types.add(entry["type"])
+        for term in entry["terms"]:
+            if (entry["type"], term) not in self.term_postings:
+                self.term_postings[(entry["type"], term)] = set()
+                self.vocabulary[term] = self.vocabulary.get(term, 0) + 1
+                self.vocabulary_list = None
+            self.term_postings[(entry["type"], term)].add(entry["uuid"])
+        for term in entry["title_terms"]:
+            self.title_postings.setdefault((entry["type"], term), set()).add(entry["uuid"])
+        self.bucket_postings.setdefault((entry["type"], entry["category"], entry["room"]), set()).add(entry["uuid"])
+    
+    @staticmethod
+    def _discard(postings: dict, key: tuple, uuid: str):
+        uuids = postings.get(key)
+        if uuids is not None:
+            uuids.discard(uuid)
+            if not uuids:
+                del postings[key]
+
+
+class ChangeLog:
+    """
+    Log of the listing creations and deletions seen by this process, numbered by a
+    version that increases with every change. Versions are handed out to clients as
+    "<epoch>.<version>" tokens, the epoch tells tokens of other processes or of an
+    earlier start apart.
+    
+    Parameters
+    ----------
+    max_size : int
+        Number of changes kept, older versions can not be resumed from.
+    """
+    
+    def __init__(self, max_size: int):
+        self.epoch = os.urandom(4).hex()
+        self.version = 0
+        self.changes = deque(maxlen=max_size)     # (version, op, row)
+        self.recorded = OrderedDict()               # (op, uuid) of the kept changes
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+    
+    def record(self, op: str, rows: list):
+        """
+        Record that rows were created (op="create") or deleted (op="delete")
+        and wake up everyone waiting for changes.
+        """
+        
+        with self.lock:
+            for row in rows:
+                self.version += 1
+                self.changes.append((self.version, op, dict(row)))
+                self.recorded[(op, row["uuid"])] = self.version
+                self.recorded.move_to_end((op, row["uuid"]))
+                while len(self.recorded) > self.max_size:
+                    self.recorded.popitem(last=False)
+            self.changed.notify_all()
+    
+    def is_recorded(self, op: str, uuid: str):
+        with self.lock:
+            return (op, uuid) in self.recorded
+    
+    def wait(self, token: str, timeout: float):
+        """
+        Wait up to `timeout` seconds for changes after the version of `token`,
+        returns the same as `since`.
+        """
+        
+        with self.lock:
+            _, _, version = token.partition(".")
+            if version.isdigit():
+                self.changed.wait_for(lambda: self.version > int(version), timeout=timeout)
+        return self.since(token)
+    
+    def token(self):
+        with self.lock:
+            return f"{self.epoch}.{self.version}"
+    
+    def since(self, token: str):
+        """
+        Return the changes after the version of `token` and the current token,
+        or (None, current token) if the version is unknown or no longer kept.
+        """
+        
+        with self.lock:
+            current = f"{self.epoch}.{self.version}"
+            epoch, _, version = token.partition(".")
+            if epoch != self.epoch or not version.isdigit() or int(version) > self.version:
+                return None, current
+            version = int(version)
+            oldest = self.changes[0][0] if self.changes else self.version + 1
+            if version + 1 < oldest:
+                return None, current
+            return [change for change in self.changes if change[0] > version], current
+
+
+class ResponseCompressor:
+    """
+    Incremental brotli ("br") or gzip compressor for response bodies.
+    
+    Parameters
+    ----------
+    encoding : str
+        "br" or "gzip", see accepted_encoding().
+    """
+    
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    
+    def compress(self, data: bytes, flush: bool = False):
+        """
+        Compress the next part of the body. With `flush`, everything compressed so far is
+        returned, so a streamed response can send it right away.
+        """
+        
+        if self.encoding == "br":
+            return self.compressor.process(data) + (self.compressor.flush() if flush else b"")
+        return self.compressor.compress(data) + (self.compressor.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+    
+    def finish(self):
+        if self.encoding == "br":
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+listings_cache: ListingsCache = ListingsCache(
+    ttl=CACHE_TTL,
+    enabled=CACHE_ENABLED,
+    stale_ttl=CACHE_STALE_TTL,
+    max_rows=CACHE_MAX_ROWS,
+    max_queries=CACHE_MAX_QUERIES
+)
+image_cache: ImageCache = ImageCache(
+    max_bytes=IMAGE_CACHE_MAX_BYTES, ttl=CACHE_TTL, enabled=CACHE_ENABLED, max_entries=IMAGE_CACHE_MAX_ENTRIES
+)
+listings_index: ListingsIndex = ListingsIndex(match_cache_size=MATCH_CACHE_SIZE)
+single_flight: SingleFlight = SingleFlight()
+change_log: ChangeLog = ChangeLog(max_size=CHANGE_LOG_SIZE)
+
+# content versions seen by this process: key -> (etag, first seen), see content_version()
+content_versions: OrderedDict = OrderedDict()
+content_versions_lock: threading.Lock = threading.Lock()
+
+
+@api.app_errorhandler(413)
+def request_too_large(error):
+    return {"error": "Request too large"}, 413
+
+
+@api.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@api.after_app_request
+def record_request(response: Response):
+    """
+    Record latency, phase timings, payload sizes and errors of every request in the metrics,
+    and add the Server-Timing header if enabled.
+    """
+    
+    seconds = time.perf_counter() - g.pop("request_start", time.perf_counter())
+    timings = g.pop("timings", {})
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    
+    metrics.observe("http_request_duration_seconds", seconds, method=request.method, endpoint=endpoint, status=response.status_code)
+    for phase, phase_seconds in timings.items():
+        metrics.observe("http_request_phase_seconds", phase_seconds, endpoint=endpoint, phase=phase)
+    if request.content_length:
+        metrics.observe("http_request_size_bytes", request.content_length, endpoint=endpoint)
+    if response.content_length is not None:
+        metrics.observe("http_response_size_bytes", response.content_length, endpoint=endpoint)
+    if response.status_code >= 400:
+        body = response.get_json(silent=True) if response.is_json else None
+        cause = body.get("error") if isinstance(body, dict) else None
+        metrics.inc("http_errors_total", endpoint=endpoint, status=response.status_code, cause=cause or "none")
+    
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = ", ".join(
+            [f"{phase};dur={phase_seconds * 1000:.1f}" for phase, phase_seconds in timings.items()]
+            + [f"total;dur={seconds * 1000:.1f}"]
+        )
+        if current_app.config["FRONTEND_ENDPOINT"]:
+            response.headers["Timing-Allow-Origin"] = current_app.config["FRONTEND_ENDPOINT"]
+    return response
+
+
+# content types of responses that are compressed
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/x-ndjson", "text/plain")
+
+
+@api.after_app_request
+def compress_response(response: Response):
+    """
+    Compress JSON and text responses with the encoding accepted by the client.
+    Streamed responses compress themselves, see streamed_listings_response().
+    """
+    
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    
+    response.vary.add("Accept-Encoding")
+    encoding = accepted_encoding()
+    if encoding is None or response.content_length < COMPRESS_MIN_BYTES:
+        return response
+    
+    with timed("compress"):
+        compressor = ResponseCompressor(encoding)
+        response.set_data(compressor.compress(response.get_data()) + compressor.finish())
+    response.headers["Content-Encoding"] = encoding
+    # the compressed body differs byte by byte, but not in meaning
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
 
-@app.get("/listings")
+# "br" or "gzip", whichever the client accepts with higher preference (brotli on a tie), or None
+def accepted_encoding():
+    if not RESPONSE_COMPRESSION:
+        return None
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    qualities = {encoding: request.accept_encodings.quality(encoding) for encoding in encodings}
+    best = max(encodings, key=lambda encoding: qualities[encoding])
+    return best if qualities[best] > 0 else None
+
+
+@api.get("/metrics")
+def get_metrics():
+    """
+    GET /metrics
+    
+    Return the request, Supabase and duplicate check metrics of this process in the Prometheus text format.
+    
+    Response
+    --------
+    200: text/plain
+        http_request_duration_seconds, http_request_phase_seconds, http_request_size_bytes,
+        http_response_size_bytes, http_errors_total, supabase_request_duration_seconds,
+        supabase_request_size_bytes, supabase_response_size_bytes, supabase_errors_total,
+        duplicate_comparisons_total, duplicate_matches_total
+    """
+    
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@api.get("/listings")
 def get_listings():
     """
     GET /listings
     
-    Fetch all records from the "listings" table and attach according base64-encoded PNG image (if present) for each record.
+    Fetch all records from the "listings" table and attach according base64-encoded image (if present) for each record.
+
+    Query Parameters
+    ----------------
+    images : str (optional)
+        - "inline" (default): attach base64-encoded image as "b64_image".
+        - "url": attach "image_url" and "thumbnail_url" instead (see GET /listings/<uuid>/image).
+        - "none": attach no image fields at all.
+        Example: GET /listings?images=url
+    type, category, room : str (optional)
+        Only return listings with exactly this value.
+    created_from, created_to : str (optional) - "YYYY-MM-DD"
+        Only return listings created on or after / on or before this date.
+    order : str (optional)
+        "desc" (newest first) or "asc" (oldest first) by created_at.
+    limit : int (optional)
+        Return a single page of at most `limit` listings (max. LISTINGS_MAX_PAGE_SIZE).
+    after : str (optional)
+        Cursor returned as "next_cursor" by the previous page.
+        Example: GET /listings?category=Elektronik&order=desc&limit=20&after=...
+    since : str (optional)
+        Version from the "X-Listings-Version" header of an earlier response.
+        Returns only the listings added and removed since then (not combinable with `limit`).
+        Example: GET /listings?since=3f2a9c1e.42
+    stream : str (optional)
+        - "json": send the same body, but one listing at a time as soon as its image is ready.
+        - "ndjson": send one listing object per line (application/x-ndjson), with `limit` followed
+          by a last line {"next_cursor": (str | null)}.
+        Listings are read from the database in pages of STREAM_PAGE_SIZE, newest first unless
+        `order` is given, so memory per request stays bounded. Not combinable with `since`.
+        Example: GET /listings?stream=ndjson
+
+    Conditional Requests
+    --------------------
+    Responses carry an ETag, Last-Modified and "X-Listings-Version" header.
+    Requests with a matching If-None-Match (or If-Modified-Since) header are answered with 304.
+    Streamed responses only carry the "X-Listings-Version" header.
+
+    Compression
+    -----------
+    Responses are compressed with brotli or gzip if accepted by the client (Accept-Encoding).
 
     Response
     --------
@@ -84,52 +1392,435 @@ def get_listings():
             "room": (str),
             "category": (str),
             "contact_email": (str | null),
-            "b64_image": (str | null)       # "data:image/png;base64,..."
+            "b64_image": (str | null)       # "data:image/webp;base64,..." (image/png for older images)
         },
         ...
     ]
-    """
     
-    try:
-        response_table = (
-            supabase.table("listings")
-            .select("*")
-            .execute()
-        )
-        
-        all_listings: list = response_table.data
-        
-        for listing in all_listings:
-            listing["b64_image"] = None
-            try:
-                # Download according image and add to listing if present
-                image_bin: bytes = (
-                    supabase.storage
-                    .from_("images")
-                    .download(f"{listing['uuid']}.png")
-                )
-                listing["b64_image"] = "data:image/png;base64," + base64.b64encode(image_bin).decode('utf-8')
-            except Exception:
-                pass
-            
-    except Exception:
-        return {"error": "Error while trying to read from database"}, 400
-
-    return all_listings, 200
+    200 - if `limit` is given, one page of listings:
+    {
+        "listings": [ ... listings objects ... ],
+        "next_cursor": (str | null)     # null on the last page
+    }
+    
+    200 - if `since` is given, the changes since that version:
+    {
+        "version": (str),
+        "added": [ ... listings objects ... ],
+        "removed": [ (str), ... ]       # uuids
+    }
+    
+    304 - not modified
+    
+    410 Gone - `since` version is unknown to this server or expired, or changes of other server
+    processes are not tracked (CHANGE_LOG_COMPLETE), fetch all listings again:
+    {
+        "error": (str),
+        "version": (str)
+    }
+    
+    400 Bad Request:
+    {
+        "error": "Invalid images mode"
+    }
+    OR
+    {
+        "error": "Invalid stream format"
+    }
+    OR
+    {
+        "error": "since can not be combined with limit" | "since can not be combined with stream"
+    }
+    OR
+    {
+        "error": (str)                  # invalid filter / pagination parameter
+    }
+    """
+    
+    images_mode: str = request.args.get("images", "inline")
+    if images_mode not in IMAGES_MODES:
+        return {"error": "Invalid images mode"}, 400
+    
+    stream_format: str | None = request.args.get("stream")
+    if stream_format not in (None, *STREAM_FORMATS):
+        return {"error": "Invalid stream format"}, 400
+    
+    try:
+        listings_query = parse_listings_query(request.args)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    
+    since: str | None = request.args.get("since")
+    if since is not None:
+        if listings_query["limit"] is not None:
+            return {"error": "since can not be combined with limit"}, 400
+        if stream_format is not None:
+            return {"error": "since can not be combined with stream"}, 400
+        return get_listings_delta(since, listings_query, images_mode)
+    
+    version: str = change_log.token()
+    
+    if stream_format is not None:
+        return streamed_listings_response(listings_query, images_mode, stream_format, version)
+    
+    try:
+        all_listings: list = select_listings(listings_query)
+        
+        next_cursor = None
+        if listings_query["limit"] is not None and len(all_listings) > listings_query["limit"]:
+            # one more row than requested was fetched, so there is a next page
+            all_listings = all_listings[:listings_query["limit"]]
+            next_cursor = encode_cursor(all_listings[-1])
+        
+        # answer unchanged listings with 304 before downloading any image
+        etag, last_modified = content_version(("listings", query_key(listings_query), images_mode), all_listings)
+        if is_not_modified(etag, last_modified):
+            return conditional_response(None, etag, last_modified, version)
+        
+        if images_mode == "inline":
+            # Download according images concurrently and add to listings if present
+            attach_images(all_listings)
+        elif images_mode == "url":
+            attach_image_urls(all_listings, list_legacy_image_names(all_listings))
+            
+    except Exception:
+        return {"error": "Error while trying to read from database"}, 400
+
+    if listings_query["limit"] is not None:
+        return conditional_response({"listings": all_listings, "next_cursor": next_cursor}, etag, last_modified, version)
+
+    return conditional_response(all_listings, etag, last_modified, version)
+
+
+# helpers for streaming GET /listings
+# formats of streamed list responses ("stream" query parameter)
+STREAM_FORMATS = ("json", "ndjson")
+
+
+# streams the listings for the parsed GET /listings query parameters as JSON or NDJSON,
+# compressed as accepted by the client
+def streamed_listings_response(listings_query: dict, images_mode: str, stream_format: str, version: str):
+    pages = iter_listing_pages(listings_query)
+    try:
+        # the first page is read before the response starts, so read errors are still answered with 400
+        first_page = next(pages)
+    except Exception:
+        return {"error": "Error while trying to read from database"}, 400
+    
+    encoding = accepted_encoding()
+    parts = listings_stream_parts(first_page, pages, images_mode, stream_format, listings_query["limit"] is not None)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Listings-Version": version, "Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(
+        stream_with_context(stream_chunks(parts, encoding)),
+        mimetype="application/json" if stream_format == "json" else "application/x-ndjson",
+        headers=headers
+    )
+
+
+# yields (listings, next_cursor) pages for the parsed GET /listings query parameters.
+# Without limit, all listings are read in pages of STREAM_PAGE_SIZE (keyset pagination),
+# straight from the database: caching them would keep the whole table in memory again.
+def iter_listing_pages(listings_query: dict):
+    if listings_query["limit"] is not None:
+        rows = select_listings(listings_query)
+        if len(rows) > listings_query["limit"]:
+            rows = rows[:listings_query["limit"]]
+            yield rows, encode_cursor(rows[-1])
+        else:
+            yield rows, None
+        return
+    
+    page_query = {**listings_query, "order": listings_query["order"] or "desc", "limit": STREAM_PAGE_SIZE}
+    while True:
+        rows = build_listings_query(page_query).execute().data
+        if len(rows) <= STREAM_PAGE_SIZE:
+            yield rows, None
+            return
+        rows = rows[:STREAM_PAGE_SIZE]
+        yield rows, None
+        page_query = {**page_query, "after": (rows[-1]["created_at"], rows[-1]["uuid"])}
+
+
+# yields the body of a streamed list response in parts, one listing per part.
+# An empty part marks the end of a page, see stream_chunks().
+def listings_stream_parts(first_page: tuple, pages, images_mode: str, stream_format: str, paginated: bool):
+    next_cursor = first_page[1]
+    if stream_format == "json":
+        yield '{"listings":[' if paginated else "["
+    
+    first = True
+    image_names = None
+    try:
+        for listings, _ in itertools.chain([first_page], pages):
+            if images_mode == "url":
+                if image_names is None and not all(listing.get("image_hash") for listing in listings):
+                    image_names = list_image_names()
+                attach_image_urls(listings, image_names or set())
+            if images_mode == "inline":
+                listings = iter_with_images(listings)
+            
+            for listing in listings:
+                if stream_format == "json":
+                    yield ("" if first else ",") + compact_json(listing)
+                else:
+                    yield compact_json(listing) + "\n"
+                first = False
+            yield ""
+    except Exception as e:
+        # the status is sent already, a JSON body stays incomplete and NDJSON ends with an error object
+        print(f"[ERROR] {datetime.now().isoformat()} : streaming listings failed: {e}")
+        if stream_format == "ndjson":
+            yield compact_json({"error": "Error while trying to read from database"}) + "\n"
+        return
+    
+    if stream_format == "json":
+        yield f'],"next_cursor":{compact_json(next_cursor)}}}' if paginated else "]"
+    elif paginated:
+        yield compact_json({"next_cursor": next_cursor}) + "\n"
+
+
+# serializes like the JSON responses of the app, without whitespace
+def compact_json(value):
+    return current_app.json.dumps(value, separators=(",", ":"))
+
+
+# yields the given listings with "b64_image" set, in order, each as soon as its image is downloaded.
+# At most STREAM_IMAGE_WINDOW images are downloaded ahead, so memory stays bounded.
+def iter_with_images(listings: list):
+    pending = deque()
+    for listing in listings:
+        pending.append((listing, image_fetch_pool.submit(download_image, listing)))
+        if len(pending) >= STREAM_IMAGE_WINDOW:
+            yield with_b64_image(*pending.popleft())
+    while pending:
+        yield with_b64_image(*pending.popleft())
+
+
+def with_b64_image(listing: dict, image_bin: Future):
+    listing["b64_image"] = encode_b64_image(image_bin.result())
+    return listing
+
+
+# collects the parts of a streamed body into chunks of about STREAM_CHUNK_BYTES (or one page)
+# and compresses them with `encoding` (None: not compressed)
+def stream_chunks(parts, encoding: str | None):
+    compressor = ResponseCompressor(encoding) if encoding is not None else None
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_BYTES or (part == "" and size > 0):
+            chunk = "".join(buffer).encode("utf-8")
+            yield compressor.compress(chunk, flush=True) if compressor is not None else chunk
+            buffer = []
+            size = 0
+    
+    chunk = "".join(buffer).encode("utf-8")
+    if compressor is not None:
+        yield compressor.compress(chunk) + compressor.finish()
+    elif chunk:
+        yield chunk
+
+
+@api.get("/listings/stream")
+def stream_listings():
+    """
+    GET /listings/stream
+    
+    Server-Sent Events feed of listing creations and deletions.
+    
+    All clients read from the shared change log, publishing a change only wakes them up,
+    nothing is copied per client. A client lagging more than SSE_MAX_LAG changes behind
+    gets a "reset" event and is disconnected.
+    
+    Headers
+    -------
+    Last-Event-ID : str (optional)
+        Id of the last received event, the feed resumes after it. Sent automatically
+        by browsers (EventSource) on reconnect. If the id is unknown or expired,
+        a "reset" event is sent first and the client should fetch all listings again.
+
+    Response
+    --------
+    200 - text/event-stream:
+        id: (str)
+        event: "create"
+        data: { ... listing object without image ... }
+
+        id: (str)
+        event: "delete"
+        data: {"uuid": (str)}
+
+        event: "reset"
+        data: {"version": (str)}
+    
+    410 Gone - changes of other server processes are not tracked (CHANGE_LOG_COMPLETE),
+    poll GET /listings instead:
+    {
+        "error": (str),
+        "version": (str)
+    }
+    
+    503 - too many connected clients
+    """
+    
+    global stream_clients
+    
+    last_event_id: str | None = request.headers.get("Last-Event-ID")
+    
+    if not CHANGE_LOG_COMPLETE:
+        # the feed would silently miss the changes made through other workers
+        return {"error": "Changes of other server processes are not tracked, poll the listings instead", "version": change_log.token()}, 410
+    
+    with stream_clients_lock:
+        if stream_clients >= SSE_MAX_CLIENTS:
+            return {"error": "Too many connected clients"}, 503
+        stream_clients += 1
+    
+    def events():
+        position = change_log.token()
+        if last_event_id:
+            changes, _ = change_log.since(last_event_id)
+            if changes is None:
+                yield sse_event("reset", {"version": position})
+            else:
+                position = last_event_id
+        
+        while True:
+            changes, current = change_log.wait(position, timeout=SSE_HEARTBEAT_INTERVAL)
+            if changes is None or len(changes) > SSE_MAX_LAG:
+                # fell too far behind, the client has to fetch all listings again
+                yield sse_event("reset", {"version": current})
+                return
+            if not changes:
+                yield ": heartbeat\n\n"
+            for version, op, row in changes:
+                yield sse_event(op, row, f"{change_log.epoch}.{version}")
+            position = current
+    
+    response = Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    response.call_on_close(stream_client_disconnected)
+    return response
+
+
+# helpers for the change feed
+stream_clients: int = 0
+stream_clients_lock: threading.Lock = threading.Lock()
+
+
+def stream_client_disconnected():
+    global stream_clients
+    with stream_clients_lock:
+        stream_clients -= 1
+
+
+# formats a Server-Sent Event
+def sse_event(event: str, data: dict, id: str | None = None):
+    lines = [f"id: {id}"] if id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
 
 
-@app.get("/listings/<uuid>")
+@api.get("/listings/search")
+def search_listings():
+    """
+    GET /listings/search
+    
+    Full-text search over titles and descriptions of all listings. Search words also find
+    their synonyms (e.g. "handy" finds "smartphone") and tolerate typos.
+    
+    Query Parameters
+    ----------------
+    q : str
+        Search words.
+    limit : int (optional)
+        Number of results per page (default 20, max. LISTINGS_MAX_PAGE_SIZE).
+    offset : int (optional)
+        Number of results to skip (default 0).
+        Example: GET /listings/search?q=schwarzes handy&limit=20&offset=20
+
+    Response
+    --------
+    200 - one page of results, best first:
+    {
+        "total": (int),                     # number of all results
+        "next_offset": (int | null),        # null on the last page
+        "results": [
+            {
+                "score": (float),
+                "listing": { ... listing object without image ... }
+            },
+            ...
+        ]
+    }
+    
+    400 Bad Request:
+    {
+        "error": (str)                      # missing q or invalid limit / offset
+    }
+    """
+    
+    query: str = request.args.get("q", "").strip()
+    if not query:
+        return {"error": "Missing search query"}, 400
+    
+    try:
+        limit = int(request.args.get("limit", "20"))
+        offset = int(request.args.get("offset", "0"))
+    except ValueError:
+        return {"error": "limit and offset must be integers"}, 400
+    if not 1 <= limit <= LISTINGS_MAX_PAGE_SIZE or offset < 0:
+        return {"error": f"limit must be between 1 and {LISTINGS_MAX_PAGE_SIZE}, offset must not be negative"}, 400
+    
+    try:
+        listings_index.ensure_built()
+    except Exception:
+        return {"error": "Error while trying to read from database"}, 400
+    
+    total, ranked = listings_index.search(query, offset + limit)
+    
+    results = []
+    for uuid, score in ranked[offset:]:
+        entry = listings_index.entries.get(uuid)
+        if entry is not None:
+            results.append({"score": round(score, 4), "listing": dict(entry["row"])})
+    
+    return {
+        "total": total,
+        "next_offset": offset + limit if offset + limit < total else None,
+        "results": results
+    }, 200
+
+
+@api.get("/listings/<uuid>")
 def get_listing_by_uuid(uuid: str):
     """
     GET /listings
     
-    Fetch specific record from the "listings" table by uuid and attach according base64-encoded PNG image (if present).
+    Fetch specific record from the "listings" table by uuid and attach according base64-encoded image (if present).
     
     Parameters
     ----------
     uuid : str
         UUID of the listing to get.
 
+    Query Parameters
+    ----------------
+    images : str (optional)
+        "inline" (default), "url" or "none" - same as for GET /listings.
+
+    Conditional Requests
+    --------------------
+    Same as for GET /listings, answered with 304 without reading the image.
+
     Response
     --------
     200 - listing object:
@@ -142,290 +1833,2291 @@ def get_listing_by_uuid(uuid: str):
         "room": (str),
         "category": (str),
         "contact_email": (str | null),
-        "b64_image": (str | null)       # "data:image/png;base64,..."
+        "b64_image": (str | null)       # "data:image/webp;base64,..." (image/png for older images)
     },
     """
     
+    images_mode: str = request.args.get("images", "inline")
+    if images_mode not in IMAGES_MODES:
+        return {"error": "Invalid images mode"}, 400
+    
+    version: str = change_log.token()
+    
+    try:
+        listing: dict | None = select_listing(uuid)
+        
+        if listing is None:
+            return {"error": "listing does not exist"}, 404
+        
+        etag, last_modified = content_version(("listing", uuid, images_mode), [listing])
+        if is_not_modified(etag, last_modified):
+            return conditional_response(None, etag, last_modified, version)
+        
+        if images_mode == "inline":
+            # Download according image and add to listing if present
+            listing["b64_image"] = fetch_b64_image(listing)
+        elif images_mode == "url":
+            attach_image_urls([listing], {image_path(listing)} if image_exists(listing) else set())
+        
+    except Exception:
+        return {"error": "Error while trying to read from database"}, 400
+
+    return conditional_response(listing, etag, last_modified, version)
+
+
+@api.get("/listings/<uuid>/image")
+def get_listing_image(uuid: str):
+    """
+    GET /listings/<uuid>/image
+    
+    Stream the raw image (IMAGE_FORMAT, older images PNG or JPEG) of a listing. Responses carry an ETag and Cache-Control header,
+    so browsers can cache them and revalidate with If-None-Match (answered with 304 Not Modified).
+    
+    Parameters
+    ----------
+    uuid : str
+        UUID of the listing whose image to get.
+
+    Query Parameters
+    ----------------
+    size : str (optional)
+        - "full" (default): the image as uploaded.
+        - "thumb": a downscaled thumbnail (at most THUMBNAIL_SIZE pixels wide/high).
+        Example: GET /listings/<uuid>/image?size=thumb
+
+    Response
+    --------
+    200 - image bytes (image/webp, or image/png for IMAGE_FORMAT=PNG and older images)
+    304 - not modified
+    404 - listing has no image
+    """
+    
+    size: str = request.args.get("size", "full")
+    if size not in ("full", "thumb"):
+        return {"error": "Invalid image size"}, 400
+    
+    # no listing, so no image either (the database rejects malformed uuids)
+    if not UUID_PATTERN.fullmatch(uuid.lower()):
+        return {"error": "image does not exist"}, 404
+    
     try:
-        response_table = (
+        listing: dict | None = select_listing(uuid)
+    except Exception:
+        return {"error": "Error while trying to read from database"}, 400
+    if listing is None:
+        return {"error": "image does not exist"}, 404
+    
+    if size == "thumb":
+        # thumbnails are stored since images are ingested, older images are scaled down on request
+        image_bin: bytes | None = download_image(listing, "thumb")
+        if image_bin is not None:
+            return image_response(image_bin)
+    
+    image_bin = download_image(listing)
+    if image_bin is None:
+        return {"error": "image does not exist"}, 404
+    
+    if size == "thumb":
+        try:
+            image_bin = make_thumbnail(image_bin)
+        except Exception:
+            return {"error": "Error while trying to create thumbnail"}, 400
+    
+    return image_response(image_bin)
+
+
+@api.get("/images/<image_hash>")
+def get_image(image_hash: str):
+    """
+    GET /images/<image_hash>
+    
+    Stream a content-addressed image, as linked by "image_url" / "thumbnail_url" of listings.
+    The image at a hash never changes, so responses may be cached forever.
+
+    Query Parameters
+    ----------------
+    size : str (optional)
+        - "full" (default) or "thumb", see GET /listings/<uuid>/image
+
+    Response
+    --------
+    200 - image bytes (Cache-Control: immutable)
+    304 - not modified
+    404 - image does not exist
+    """
+    
+    size: str = request.args.get("size", "full")
+    if size not in ("full", "thumb"):
+        return {"error": "Invalid image size"}, 400
+    if not IMAGE_HASH_PATTERN.fullmatch(image_hash):
+        return {"error": "image does not exist"}, 404
+    
+    # the ETag follows from the hash, so revalidations are answered without downloading the image
+    etag: str = image_hash if size == "full" else f"{image_hash}-thumb"
+    if request.if_none_match.contains_weak(etag):
+        return image_response(None, immutable=True, etag=etag)
+    
+    image_bin: bytes | None = download_image({"image_hash": image_hash}, size)
+    if image_bin is None:
+        return {"error": "image does not exist"}, 404
+    
+    return image_response(image_bin, immutable=True, etag=etag)
+
+
+@api.get("/listings/<uuid>/matches")
+def get_listing_matches(uuid: str):
+    """
+    GET /listings/<uuid>/matches
+    
+    Suggest listings of the opposite type (lost <-> found) that may be the same item,
+    ranked by a combined score of title and description similarity (including synonyms),
+    same category and closeness in room and time.
+    
+    Parameters
+    ----------
+    uuid : str
+        UUID of the listing to find matches for.
+
+    Query Parameters
+    ----------------
+    k : int (optional)
+        Number of matches to return (default 10, max. MATCH_MAX_K).
+        Example: GET /listings/<uuid>/matches?k=5
+
+    Response
+    --------
+    200 - matches, best first:
+    {
+        "matches": [
+            {
+                "score": (float),           # 0-1
+                "listing": { ... listing object without image ... }
+            },
+            ...
+        ]
+    }
+    
+    400 Bad Request:
+    {
+        "error": (str)                      # invalid k or listing type without opposite type
+    }
+    
+    404 - listing does not exist
+    """
+    
+    try:
+        k = int(request.args.get("k", "10"))
+    except ValueError:
+        return {"error": "k must be an integer"}, 400
+    if not 1 <= k <= MATCH_MAX_K:
+        return {"error": f"k must be between 1 and {MATCH_MAX_K}"}, 400
+    
+    try:
+        listings_index.ensure_built()
+        entry = listings_index.entries.get(uuid)
+        if entry is None and UUID_PATTERN.fullmatch(uuid.lower()):
+            # possibly created by another process since the last resync of the index
+            row = select_listing(uuid)
+            if row is not None:
+                listings_index.add(row)
+                entry = listings_index.entries.get(uuid)
+    except Exception:
+        return {"error": "Error while trying to read from database"}, 400
+    
+    if entry is None:
+        return {"error": "listing does not exist"}, 404
+    if entry["type"] not in OPPOSITE_TYPES:
+        return {"error": f"listings of type '{entry['type']}' can not be matched"}, 400
+    
+    ranked = listings_index.get_matches(uuid)
+    if ranked is None:
+        # ranked without holding the lock, a listing added meanwhile invalidates the ranking
+        generation = listings_index.generation
+        ranked = rank_matches(entry)
+        listings_index.put_matches(uuid, ranked, generation=generation)
+    
+    matches = []
+    for match_uuid, score in ranked[:k]:
+        match = listings_index.entries.get(match_uuid)
+        if match is not None:
+            matches.append({"score": score, "listing": dict(match["row"])})
+    
+    return {"matches": matches}, 200
+
+
+# helpers for lost-vs-found matching
+OPPOSITE_TYPES = {"lost": "found", "found": "lost"}
+
+
+# reads all rows (or only the given columns) of the "listings" table in pages
+def load_all_listings(page_size: int = 1000, columns: str = "*"):
+    rows = []
+    while True:
+        page = (
+            supabase.table("listings")
+            .select(columns)
+            .order("uuid")
+            .range(len(rows), len(rows) + page_size - 1)
+            .execute()
+            .data
+        )
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+# reads the rows of the given uuids, in chunks that keep the request URL short
+def load_listings(uuids: list, chunk_size: int = 200):
+    rows = []
+    for start in range(0, len(uuids), chunk_size):
+        rows.extend(
             supabase.table("listings")
             .select("*")
-            .eq("uuid", uuid)
+            .in_("uuid", uuids[start:start + chunk_size])
             .execute()
+            .data
         )
-        
-        if len(response_table.data) == 0:
-            return {"error": "listing does not exist"}, 404
-        
-        listing: list = response_table.data[0]
-        listing["b64_image"] = None
-        
+    return rows
+
+
+# precomputes everything matching and searching need to know about a listing
+def index_entry(row: dict):
+    title = row.get("title") or ""
+    description = row.get("description") or ""
+    room = row.get("room") or ""
+    created_at = str(row.get("created_at") or "")[:10]
+    try:
+        day = datetime.fromisoformat(created_at).toordinal()
+    except ValueError:
+        day = None
+    return {
+        "uuid": row["uuid"],
+        "row": dict(row),
+        "type": row.get("type"),
+        "category": row.get("category"),
+        "room": row.get("room"),
+        # building of the room is its first letter, e.g. "B" for "B002"
+        "building": room[0] if room[:1].isalpha() else None,
+        "created_at": created_at,
+        "day": day,
+        "title": title.lower(),
+        "description": description.lower(),
+        "title_terms": title_terms(title),
+        "terms": title_terms(title) | title_terms(description),
+    }
+
+
+# checks whether `entry` could appear in the matches of `other`
+def is_match_candidate(other: dict, entry: dict):
+    if OPPOSITE_TYPES.get(other["type"]) != entry["type"]:
+        return False
+    same_bucket = other["category"] == entry["category"] and other["room"] == entry["room"]
+    return same_bucket or not other["terms"].isdisjoint(entry["terms"])
+
+
+# ranks the candidates of opposite type for a listing, best first, at most MATCH_MAX_K
+def rank_matches(entry: dict):
+    import numpy
+    from rapidfuzz.fuzz import ratio
+    from rapidfuzz.process import cdist
+    
+    with listings_index.lock:
+        candidate_uuids = listings_index.candidates(entry, OPPOSITE_TYPES[entry["type"]], MATCH_MAX_CANDIDATES)
+        candidates = [listings_index.entries[uuid] for uuid in candidate_uuids]
+    if not candidates:
+        return []
+    
+    # fuzzy similarity of titles and descriptions against all candidates in one native call each
+    title_scores = cdist([entry["title"]], [c["title"] for c in candidates], scorer=ratio, dtype=numpy.float64, workers=DUPLICATE_CHECK_WORKERS)[0]
+    description_scores = cdist([entry["description"]], [c["description"] for c in candidates], scorer=ratio, dtype=numpy.float64, workers=DUPLICATE_CHECK_WORKERS)[0]
+    
+    # synonyms count as similar titles, too
+    title_similarity = numpy.maximum(
+        title_scores / 100,
+        [term_overlap(entry["title_terms"], c["title_terms"]) for c in candidates]
+    )
+    score = (
+        MATCH_WEIGHTS["title"] * title_similarity
+        + MATCH_WEIGHTS["description"] * description_scores / 100
+        + MATCH_WEIGHTS["category"] * numpy.array([c["category"] == entry["category"] for c in candidates])
+        + MATCH_WEIGHTS["room"] * numpy.array([room_proximity(entry, c) for c in candidates])
+        + MATCH_WEIGHTS["time"] * numpy.array([time_proximity(entry, c) for c in candidates])
+    )
+    
+    best = numpy.argsort(-score, kind="stable")[:MATCH_MAX_K]
+    return [(candidates[i]["uuid"], round(float(score[i]), 4)) for i in best]
+
+
+# share of the terms of the shorter term set that also occur in the other one (0-1)
+def term_overlap(terms_a: frozenset, terms_b: frozenset):
+    if not terms_a or not terms_b:
+        return 0.0
+    return len(terms_a & terms_b) / min(len(terms_a), len(terms_b))
+
+
+# 1 for the same room, 0.5 for rooms in the same building (e.g. "B002" and "B010"), else 0
+def room_proximity(entry_a: dict, entry_b: dict):
+    if entry_a["room"] is not None and entry_a["room"] == entry_b["room"]:
+        return 1.0
+    if entry_a["building"] is not None and entry_a["building"] == entry_b["building"]:
+        return 0.5
+    return 0.0
+
+
+# 1 for the same day, falling linearly to 0 at MATCH_TIME_WINDOW_DAYS apart
+def time_proximity(entry_a: dict, entry_b: dict):
+    if entry_a["day"] is None or entry_b["day"] is None:
+        return 0.0
+    return max(0.0, 1 - abs(entry_a["day"] - entry_b["day"]) / MATCH_TIME_WINDOW_DAYS)
+
+
+# helpers for conditional requests and change versions
+# answers GET /listings?since=<version> with the listings added and removed since that version
+def get_listings_delta(since: str, listings_query: dict, images_mode: str):
+    if not CHANGE_LOG_COMPLETE:
+        return {"error": "Changes of other server processes are not tracked, fetch all listings again", "version": change_log.token()}, 410
+    
+    changes, version = change_log.since(since)
+    if changes is None:
+        return {"error": "Unknown or expired version, fetch all listings again", "version": version}, 410
+    
+    added = {}
+    removed = []
+    for _, op, row in changes:
+        if op == "create":
+            if listing_matches_query(row, listings_query):
+                # copy, images are attached below and the logged row is shared with all clients
+                added[row["uuid"]] = dict(row)
+        else:
+            added.pop(row["uuid"], None)
+            removed.append(row["uuid"])
+    added_listings = list(added.values())
+    
+    try:
+        if images_mode == "inline":
+            attach_images(added_listings)
+        elif images_mode == "url":
+            attach_image_urls(added_listings, list_legacy_image_names(added_listings))
+    except Exception:
+        return {"error": "Error while trying to read from database"}, 400
+    
+    response = make_response({"version": version, "added": added_listings, "removed": removed}, 200)
+    response.headers["X-Listings-Version"] = version
+    return response
+
+
+# returns (etag, last modified) of a response identified by `key` and built from the given listing rows.
+# Listing rows are never changed after creation except for their image (PUT /listings/<uuid>/image),
+# so uuid and image hash identify the content, whichever process replaced the image.
+# last modified is the time this process first saw this content for the key
+def content_version(key: tuple, listings: list):
+    content = [(listing["uuid"], listing.get("image_hash")) for listing in listings]
+    etag = hashlib.sha256(json.dumps([key, content]).encode("utf-8")).hexdigest()[:32]
+    with content_versions_lock:
+        seen = content_versions.get(key)
+        if seen is None or seen[0] != etag:
+            seen = (etag, datetime.now(timezone.utc).replace(microsecond=0))
+            content_versions[key] = seen
+        content_versions.move_to_end(key)
+        while len(content_versions) > CONTENT_VERSIONS_SIZE:
+            content_versions.popitem(last=False)
+    return seen
+
+
+# checks the conditional request headers, If-None-Match takes precedence over If-Modified-Since
+def is_not_modified(etag: str, last_modified: datetime):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+# builds a JSON response (or 304 Not Modified without body if body is None) carrying the version headers
+# `version` must be read from the change log before the listings were read
+def conditional_response(body, etag: str, last_modified: datetime, version: str):
+    response = make_response(body, 200) if body is not None else Response(status=304)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # clients may keep the response, but have to revalidate it on every use
+    response.cache_control.no_cache = True
+    response.headers["X-Listings-Version"] = version
+    return response
+
+
+# helpers for filtering and paginating listings
+# validates the query parameters of GET /listings, raises ValueError with a message for the client
+def parse_listings_query(args):
+    listings_query = {
+        "type": args.get("type"),
+        "category": args.get("category"),
+        "room": args.get("room"),
+        "created_from": args.get("created_from"),
+        "created_to": args.get("created_to"),
+        "order": args.get("order"),
+        "limit": args.get("limit"),
+        "after": args.get("after"),
+    }
+    
+    for key in ["created_from", "created_to"]:
+        if listings_query[key] is not None:
+            try:
+                datetime.strptime(listings_query[key], "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"{key} must be a date (YYYY-MM-DD)")
+    
+    if listings_query["order"] not in (None, "asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
+    
+    if listings_query["limit"] is not None:
+        try:
+            listings_query["limit"] = int(listings_query["limit"])
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if not 1 <= listings_query["limit"] <= LISTINGS_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {LISTINGS_MAX_PAGE_SIZE}")
+        # pages are always ordered, newest first unless requested otherwise
+        listings_query["order"] = listings_query["order"] or "desc"
+    
+    if listings_query["after"] is not None:
+        if listings_query["limit"] is None:
+            raise ValueError("after requires limit")
+        listings_query["after"] = decode_cursor(listings_query["after"])
+    
+    return listings_query
+
+
+# builds the PostgREST query for GET /listings, so filtering, ordering and paging happen in the database
+def build_listings_query(listings_query: dict, client: "Client | AsyncClient | None" = None):
+    query = (client or supabase).table("listings").select("*")
+    
+    for key in ["type", "category", "room"]:
+        if listings_query[key] is not None:
+            query = query.eq(key, listings_query[key])
+    if listings_query["created_from"] is not None:
+        query = query.gte("created_at", listings_query["created_from"])
+    if listings_query["created_to"] is not None:
+        # inclusive date, so also the rows created later on that day: before the next day
+        next_day = datetime.strptime(listings_query["created_to"], "%Y-%m-%d").date() + timedelta(days=1)
+        query = query.lt("created_at", next_day.isoformat())
+    
+    if listings_query["order"] is not None:
+        desc = listings_query["order"] == "desc"
+        
+        if listings_query["after"] is not None:
+            # keyset pagination on (created_at, uuid): continue strictly behind the cursor row
+            created_at, uuid = listings_query["after"]
+            op = "lt" if desc else "gt"
+            query = query.or_(
+                f'created_at.{op}."{created_at}",'
+                f'and(created_at.eq."{created_at}",uuid.{op}.{uuid})'
+            )
+        
+        # uuid breaks ties between listings created at the same time
+        query = query.order("created_at", desc=desc).order("uuid", desc=desc)
+    
+    if listings_query["limit"] is not None:
+        # fetch one more row than requested to know whether there is a next page
+        query = query.limit(listings_query["limit"] + 1)
+    
+    return query
+
+
+# encodes the position of a listing as opaque cursor for the next page
+def encode_cursor(listing: dict):
+    position = json.dumps([listing["created_at"], listing["uuid"]])
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("utf-8")
+
+
+# decodes a cursor created by encode_cursor into (created_at, uuid)
+def decode_cursor(cursor: str):
+    try:
+        created_at, uuid = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(uuid, str) or not all(
+        c.isalnum() or c in "-:.+ " for c in created_at + uuid
+    ):
+        raise ValueError("Invalid cursor")
+    return created_at, uuid
+
+
+# helpers for reading listings through the cache
+# Concurrent misses for the same rows share one Supabase request (single_flight), stale cache
+# entries are served while one background request refreshes them.
+# returns the rows for the parsed GET /listings query parameters
+def select_listings(listings_query: dict):
+    rows, stale = listings_cache.get_query(listings_query)
+    key = ("listings", query_key(listings_query))
+    if rows is None:
+        # every waiter gets its own copies, callers modify the rows
+        return [dict(row) for row in single_flight.do(key, fetch_listings, listings_query)]
+    if stale:
+        single_flight.refresh(key, fetch_listings, listings_query)
+    return rows
+
+
+# reads the rows for the parsed GET /listings query parameters from the database and caches them
+def fetch_listings(listings_query: dict):
+    if ASYNC_SUPABASE:
+        return run_async(fetch_listings_async(listings_query), "db")
+    generation = listings_cache.generation
+    rows = build_listings_query(listings_query).execute().data
+    listings_cache.put_query(listings_query, rows, generation)
+    return rows
+
+
+async def fetch_listings_async(listings_query: dict):
+    generation = listings_cache.generation
+    rows = (await build_listings_query(listings_query, async_supabase).execute()).data
+    listings_cache.put_query(listings_query, rows, generation)
+    return rows
+
+
+# returns the row of a single listing, or None if it does not exist
+def select_listing(uuid: str):
+    row, stale = listings_cache.get_row(uuid)
+    key = ("listing", uuid)
+    if row is None:
+        row = single_flight.do(key, fetch_listing, uuid)
+        return dict(row) if row is not None else None
+    if stale:
+        single_flight.refresh(key, fetch_listing, uuid)
+    return row
+
+
+# reads the row of a single listing from the database and caches it, returns None if it does not exist
+def fetch_listing(uuid: str):
+    if ASYNC_SUPABASE:
+        return run_async(fetch_listing_async(uuid), "db")
+    generation = listings_cache.generation
+    response_table = (
+        supabase.table("listings")
+        .select("*")
+        .eq("uuid", uuid)
+        .execute()
+    )
+    if len(response_table.data) == 0:
+        forget_listing(uuid)
+        return None
+    row = response_table.data[0]
+    listings_cache.put_row(row, generation)
+    return row
+
+
+async def fetch_listing_async(uuid: str):
+    generation = listings_cache.generation
+    response_table = await (
+        async_supabase.table("listings")
+        .select("*")
+        .eq("uuid", uuid)
+        .execute()
+    )
+    if len(response_table.data) == 0:
+        forget_listing(uuid)
+        return None
+    row = response_table.data[0]
+    listings_cache.put_row(row, generation)
+    return row
+
+
+# drops a cached row of a listing that no longer exists (deleted by another process)
+def forget_listing(uuid: str):
+    if uuid in listings_cache.rows:
+        listings_cache.remove_rows([uuid])
+    listings_index.remove([uuid])
+
+
+# hashable cache key for parsed GET /listings query parameters
+def query_key(listings_query: dict):
+    return tuple(sorted(listings_query.items()))
+
+
+# checks whether a row would be part of the result of the parsed GET /listings query parameters
+def listing_matches_query(row: dict, listings_query: dict):
+    for key in ["type", "category", "room"]:
+        if listings_query[key] is not None and row.get(key) != listings_query[key]:
+            return False
+    created_at = str(row.get("created_at"))[:10]
+    if listings_query["created_from"] is not None and created_at < listings_query["created_from"]:
+        return False
+    if listings_query["created_to"] is not None and created_at > listings_query["created_to"]:
+        return False
+    return True
+
+
+# helpers for attaching images to listings
+# downloads the image of a listing (stored as IMAGE_FORMAT, older ones as PNG or JPEG), returns None if not present.
+# Concurrent downloads of the same image share one storage request.
+def download_image(listing: dict, size: str = "full"):
+    if ASYNC_SUPABASE:
+        return run_async(download_image_async(listing, size), "storage")
+    path = image_path(listing, size)
+    image_bin = image_cache.get(path)
+    if image_bin is not ImageCache.MISSING:
+        return image_bin
+    return single_flight.do(("image", path), fetch_image, path, bool(listing.get("image_hash")))
+
+
+# downloads an image from storage and caches it, returns None if not present
+def fetch_image(path: str, immutable: bool):
+    from supabase import StorageException
+    
+    try:
+        image_bin = (
+            supabase.storage
+            .from_("images")
+            .download(path)
+        )
+    except StorageException:
+        # image does not exist, remember that
+        image_cache.put(path, None)
+        return None
+    except Exception:
+        # timed out or failed download, try again on next read
+        return None
+    image_cache.put(path, image_bin, immutable=immutable)
+    return image_bin
+
+
+async def download_image_async(listing: dict, size: str = "full"):
+    path = image_path(listing, size)
+    image_bin = image_cache.get(path)
+    if image_bin is not ImageCache.MISSING:
+        return image_bin
+    return await single_flight.do_async(("image", path), fetch_image_async, path, bool(listing.get("image_hash")))
+
+
+async def fetch_image_async(path: str, immutable: bool):
+    from supabase import StorageException
+    
+    try:
+        image_bin = await (
+            async_supabase.storage
+            .from_("images")
+            .download(path)
+        )
+    except StorageException:
+        image_cache.put(path, None)
+        return None
+    except Exception:
+        return None
+    image_cache.put(path, image_bin, immutable=immutable)
+    return image_bin
+
+
+# storage path of the display image ("full") or the thumbnail ("thumb") of a listing.
+# Images are stored under the SHA-256 hash of the display image ("image_hash" of the listing),
+# images uploaded before that under the uuid of their listing.
+def image_path(listing: dict, size: str = "full"):
+    if listing.get("image_hash"):
+        return blob_path(listing["image_hash"], size)
+    if size == "thumb":
+        return f"thumbs/{listing['uuid']}.png"
+    return f"{listing['uuid']}.png"
+
+
+# storage paths of all images of a listing
+def image_paths(listing: dict):
+    return [image_path(listing, "full"), image_path(listing, "thumb")]
+
+
+# storage path of a content-addressed image, objects at these paths never change
+def blob_path(image_hash: str, size: str = "full"):
+    if size == "thumb":
+        return f"sha256/{image_hash}-thumb"
+    return f"sha256/{image_hash}"
+
+
+# content type of stored image bytes. New images are stored as IMAGE_FORMAT,
+# images uploaded before the ingest pipeline existed may be PNG or JPEG.
+def image_mimetype(image_bin: bytes):
+    if image_bin[:4] == b"RIFF" and image_bin[8:12] == b"WEBP":
+        return "image/webp"
+    if image_bin[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    return "image/png"
+
+
+# encodes image bytes as base64 data url
+def encode_b64_image(image_bin: bytes | None):
+    if image_bin is None:
+        return None
+    with timed("b64"):
+        return f"data:{image_mimetype(image_bin)};base64," + base64.b64encode(image_bin).decode('utf-8')
+
+
+# downloads the image of a listing and returns it as base64 data url, or None if not present
+def fetch_b64_image(listing: dict):
+    return encode_b64_image(download_image(listing))
+
+
+# downloads the images of all given listings as a bounded concurrent batch
+# and sets "b64_image" of every listing (None if no image is present).
+# Images are encoded on the request thread, so downloading and encoding are timed separately.
+def attach_images(listings: list):
+    if ASYNC_SUPABASE:
+        image_bins = run_async(download_images_async(listings), "storage")
+    else:
+        with timed("storage"):
+            image_bins = list(image_fetch_pool.map(download_image, list(listings)))
+    for listing, image_bin in zip(listings, image_bins):
+        listing["b64_image"] = encode_b64_image(image_bin)
+    return listings
+
+
+async def download_images_async(listings: list):
+    semaphore = asyncio.Semaphore(IMAGE_FETCH_CONCURRENCY)
+    
+    async def download(listing: dict):
+        async with semaphore:
+            return await download_image_async(listing)
+    
+    return await asyncio.gather(*(download(listing) for listing in listings))
+
+
+# image modes for list responses ("images" query parameter)
+IMAGES_MODES = ("inline", "url", "none")
+
+# "image_hash" of listings: hex SHA-256
+IMAGE_HASH_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+# returns the names of all objects in the images bucket (paged, few requests instead of one per listing)
+def list_image_names(page_size: int = 1000):
+    return {obj["name"] for obj in list_image_objects(page_size=page_size)}
+
+
+# returns all objects (and sub folders) directly inside a folder of the images bucket, paged
+def list_image_objects(folder: str = "", page_size: int = 1000):
+    objects = []
+    offset = 0
+    while True:
+        page = supabase.storage.from_("images").list(folder, {"limit": page_size, "offset": offset})
+        objects.extend(page)
+        if len(page) < page_size:
+            return objects
+        offset += page_size
+
+
+# checks whether a listing has an image without downloading it
+def image_exists(listing: dict):
+    if listing.get("image_hash"):
+        return True
+    try:
+        return supabase.storage.from_("images").exists(image_path(listing))
+    except Exception:
+        return False
+
+
+# names of the objects in the images bucket needed by attach_image_urls(),
+# only images stored by listing uuid have to be looked up
+def list_legacy_image_names(listings: list):
+    if all(listing.get("image_hash") for listing in listings):
+        return set()
+    return list_image_names()
+
+
+# sets "image_url" and "thumbnail_url" of every listing (None if no image is present).
+# Content-addressed images get immutable /images/<hash> urls.
+def attach_image_urls(listings: list, image_names: set):
+    for listing in listings:
+        if listing.get("image_hash"):
+            listing["image_url"] = f"/images/{listing['image_hash']}"
+            listing["thumbnail_url"] = f"/images/{listing['image_hash']}?size=thumb"
+        elif image_path(listing) in image_names:
+            listing["image_url"] = f"/listings/{listing['uuid']}/image"
+            listing["thumbnail_url"] = f"/listings/{listing['uuid']}/image?size=thumb"
+        else:
+            listing["image_url"] = None
+            listing["thumbnail_url"] = None
+    return listings
+
+
+# downscales an image to fit into THUMBNAIL_SIZE x THUMBNAIL_SIZE and returns it encoded as IMAGE_FORMAT
+def make_thumbnail(image_bin: bytes):
+    from PIL import Image
+    
+    with Image.open(io.BytesIO(image_bin)) as image:
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        return encode_image(image)
+
+
+# formats accepted for uploaded images
+IMAGE_INPUT_FORMATS = ("PNG", "JPEG", "WEBP", "GIF")
+
+
+# decodes the "data:<mime>;base64,..." data url of an uploaded image
+def decode_b64_image(b64_image: str):
+    # base64 needs 4 characters per 3 bytes, reject oversized images before decoding them
+    if len(b64_image) > IMAGE_MAX_BYTES * 4 // 3 + 64:
+        raise ValueError("Image too large")
+    try:
+        return base64.b64decode(b64_image.split("base64,")[-1])
+    except ValueError:
+        raise ValueError("Invalid image")
+
+
+# validates an uploaded image (binary file object) and returns {"full": display image, "thumb": thumbnail},
+# both downscaled and re-encoded as IMAGE_FORMAT without metadata (EXIF, ICC, XMP)
+def ingest_image(image_file):
+    from PIL import Image, ImageOps
+    
+    image_file.seek(0, io.SEEK_END)
+    if image_file.tell() > IMAGE_MAX_BYTES:
+        raise ValueError("Image too large")
+    image_file.seek(0)
+    
+    try:
+        with Image.open(image_file) as image:
+            # only the header is read so far, check it before decoding any pixel
+            if image.format not in IMAGE_INPUT_FORMATS:
+                raise ValueError("Unsupported image format")
+            if image.width * image.height > IMAGE_MAX_PIXELS:
+                raise ValueError("Image too large")
+            
+            # JPEGs are decoded at the smallest scale still covering the display size
+            image.draft("RGB", (IMAGE_DISPLAY_SIZE, IMAGE_DISPLAY_SIZE))
+            # rotate phone photos upright before their EXIF orientation is dropped
+            image = ImageOps.exif_transpose(image)
+    except ValueError:
+        raise
+    except Exception:
+        raise ValueError("Invalid image")
+    
+    image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    image.info = {}
+    
+    image.thumbnail((IMAGE_DISPLAY_SIZE, IMAGE_DISPLAY_SIZE))
+    display_bin = encode_image(image)
+    image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    thumbnail_bin = encode_image(image)
+    return {"full": display_bin, "thumb": thumbnail_bin}
+
+
+# same as ingest_image() for the base64 data url of an uploaded image
+def ingest_b64_image(b64_image: str):
+    return ingest_image(io.BytesIO(decode_b64_image(b64_image)))
+
+
+# returns the image of a multipart/form-data ("image" part) or raw image/* request body
+# as binary file object, or None if the request carries no image
+def request_image_file():
+    if request.mimetype == "multipart/form-data":
+        # werkzeug already buffers large file parts in a temporary file
+        image = request.files.get("image")
+        return image.stream if image else None
+    
+    if request.mimetype.startswith("image/"):
+        # copy the body in chunks, MAX_CONTENT_LENGTH is enforced while reading
+        spool = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_MEMORY)
+        shutil.copyfileobj(request.stream, spool, 64 * 1024)
+        if spool.tell() == 0:
+            return None
+        spool.seek(0)
+        return spool
+    
+    return None
+
+
+# encodes an image as IMAGE_FORMAT for storage
+def encode_image(image: "Image.Image"):
+    out = io.BytesIO()
+    if IMAGE_FORMAT == "WEBP":
+        image.save(out, format="WEBP", quality=IMAGE_QUALITY, method=4)
+    else:
+        image.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+# content hash of the images returned by ingest_image(), the "image_hash" of their listing
+def images_hash(images: dict):
+    return hashlib.sha256(images["full"]).hexdigest()
+
+
+# stores the images returned by ingest_image() under their content hash. The upload is skipped
+# if identical images are stored already (e.g. the same photo posted again after a 409).
+# Returns whether the images were stored before.
+def store_images(images: dict):
+    if ASYNC_SUPABASE:
+        return run_async(store_images_async(images), "storage")
+    image_hash = images_hash(images)
+    bucket = supabase.storage.from_("images")
+    try:
+        stored_before = bucket.exists(blob_path(image_hash))
+    except Exception:
+        stored_before = False
+    if not stored_before:
+        # thumbnail first, so an existing display image implies an existing thumbnail
+        for size in ["thumb", "full"]:
+            bucket.upload(
+                file=images[size],
+                path=blob_path(image_hash, size),
+                file_options={"content-type": image_mimetype(images[size]), "upsert": "true"}
+            )
+    for size in ["thumb", "full"]:
+        image_cache.put(blob_path(image_hash, size), images[size], immutable=True)
+    return stored_before
+
+
+async def store_images_async(images: dict):
+    image_hash = images_hash(images)
+    bucket = async_supabase.storage.from_("images")
+    try:
+        stored_before = await bucket.exists(blob_path(image_hash))
+    except Exception:
+        stored_before = False
+    if not stored_before:
+        for size in ["thumb", "full"]:
+            await bucket.upload(
+                file=images[size],
+                path=blob_path(image_hash, size),
+                file_options={"content-type": image_mimetype(images[size]), "upsert": "true"}
+            )
+    for size in ["thumb", "full"]:
+        image_cache.put(blob_path(image_hash, size), images[size], immutable=True)
+    return stored_before
+
+
+# removes a content-addressed image once no listing references it anymore and returns the removed objects.
+# The reference count is the number of listing rows with this "image_hash".
+def release_image(image_hash: str):
+    if ASYNC_SUPABASE:
+        return run_async(release_image_async(image_hash))
+    references = (
+        supabase.table("listings")
+        .select("uuid", count="exact")
+        .eq("image_hash", image_hash)
+        .limit(1)
+        .execute()
+        .count
+    )
+    if references == 0:
+        paths = [blob_path(image_hash, "full"), blob_path(image_hash, "thumb")]
+        image_cache.remove(paths)
+        return supabase.storage.from_("images").remove(paths)
+    return []
+
+
+async def release_image_async(image_hash: str):
+    response_table = await (
+        async_supabase.table("listings")
+        .select("uuid", count="exact")
+        .eq("image_hash", image_hash)
+        .limit(1)
+        .execute()
+    )
+    if response_table.count == 0:
+        paths = [blob_path(image_hash, "full"), blob_path(image_hash, "thumb")]
+        image_cache.remove(paths)
+        return await async_supabase.storage.from_("images").remove(paths)
+    return []
+
+
+# builds a cacheable image response, answering If-None-Match with 304 Not Modified
+# without `image_bin` (None) it is always 304, the ETag defaults to the hash of the image
+def image_response(image_bin: bytes | None, mimetype: str | None = None, immutable: bool = False, etag: str | None = None):
+    if image_bin is None:
+        response = Response(status=304)
+    else:
+        response = Response(image_bin, mimetype=mimetype or image_mimetype(image_bin))
+    response.set_etag(etag or hashlib.sha256(image_bin).hexdigest())
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = 365 * 24 * 60 * 60
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = IMAGE_CACHE_MAX_AGE
+    return response.make_conditional(request)
+
+
+@api.post("/listings")
+def create_listing():
+    """
+    POST /listings
+    
+    
+    Creates a new listing entry and optionally uploads an associated image.
+    Before insertion, the API checks for potential duplicates unless the request
+    is forced via the query parameter `?force=true`.
+    
+    The image (PNG, JPEG, WebP or GIF) is validated, stripped of metadata and stored
+    scaled down to IMAGE_DISPLAY_SIZE plus a thumbnail, encoded as IMAGE_FORMAT.
+
+    Duplicate Detection
+    -------------------
+    A listing is considered a potential duplicate if:
+
+    - The **room** is identical, AND
+    - The **category** is identical, AND
+    - EITHER:
+        • The title similarity (Levenshtein ratio) > 0.7, OR
+        • The normalized and synonym-expanded word sets share at least one common term.
+
+    If duplicates are detected and `force=true` is not provided,
+    the operation is aborted and a 409 response is returned.
+
+    Query Parameters
+    ----------------
+    force : bool (optional)
+        - If set to true, skips the duplicate check.
+        Example: POST /listings?force=true
+
+    Request Body (application/json)
+    -------
+    JSON body (application/json)
+    {
+        "type": (str),
+        "created_at": (str) - "YYYY-MM-DD",
+        "title": (str),
+        "description": (str),
+        "room": (str),
+        "category": (str),
+        "contact_email": (str | null),
+        "b64_image": (str | null)        # "data:image/<png|jpeg|webp|gif>;base64,...."
+    }
+    
+    OR multipart/form-data with the same fields as form fields and the image
+    as binary file part "image" instead of "b64_image".
+
+    Response
+    ---------
+    201 - the newly created listing object:
+    {
+        "uuid": (str)
+        "type": (str),
+        "created_at": (str),
+        "title": (str),
+        "description": (str),
+        "room": (str),
+        "category": (str),
+        "contact_email": (str | null)
+    }
+
+    400 Bad Request:
+    {
+        "error": "Missing required fields"
+    }
+    OR
+    {
+        "error": "Invalid image" | "Unsupported image format" | "Image too large"
+    }
+    OR
+    {
+        "error": "Error while trying to add to database"
+    }
+
+    409 Conflict – Duplicate detected:
+    {
+        "duplicate": true,
+        "matches": [ ... existing listings ... ]
+    }
+    
+    413 Request Entity Too Large - body larger than MAX_REQUEST_BYTES
+    """
+    
+    if request.mimetype == "multipart/form-data":
+        # empty form fields count as missing
+        data_body: dict = {key: value for key, value in request.form.items() if value != ""}
+        image_file = request_image_file()
+    else:
+        data_body: dict = request.get_json()
+        image_file = None
+
+    type: str | None = data_body.get("type")
+
+    created_at: str | None = data_body.get("created_at")
+    if created_at:
+        created_at = datetime.strptime(created_at, "%Y-%m-%d").isoformat()
+    
+    title: str | None = data_body.get("title")
+    description: str | None = data_body.get("description")
+    room: str | None = data_body.get("room")
+    category: str | None = data_body.get("category")
+    contact_email: str | None = data_body.get("contact_email")
+    b64_image: str | None = data_body.get("b64_image")
+
+    if not all([type, created_at, title, description, room, category]):
+        return {"error": "Missing required fields"}, 400
+    
+    # validate and scale down the image off the request thread while duplicates are checked
+    ingested_images = None
+    if image_file is not None:
+        ingested_images = image_ingest_pool.submit(ingest_image, image_file)
+    elif b64_image:
+        ingested_images = image_ingest_pool.submit(ingest_b64_image, b64_image)
+    
+    # duplikates check
+    # if force query param is not set to true, check for potential duplicates. If any found, stop execution and return them.
+    force = request.args.get("force") == "true"
+
+    if not force:
+        # get existing listings of the same room and category, only these can be duplicates
+        existing = select_listings(parse_listings_query({"room": room, "category": category}))
+
+        # check for potential duplicates
+        duplicates = [match for match, _ in find_duplicates([data_body], existing)[0]]
+
+        if duplicates:
+            if ingested_images is not None:
+                ingested_images.cancel()
+            # stop execution and return found duplicates
+            return {
+                "duplicate": True,
+                "matches": duplicates
+            }, 409
+    
+    images: dict | None = None
+    if ingested_images is not None:
+        try:
+            with timed("ingest"):
+                images = ingested_images.result()
+        except ValueError as e:
+            return {"error": str(e)}, 400
+    
+    new_row: dict = {
+        "created_at": created_at,
+        "type": type,
+        "title": title,
+        "description": description,
+        "room": room,
+        "category": category,
+        "contact_email": contact_email,
+        "image_hash": images_hash(images) if images else None
+    }
+    
+    if ASYNC_SUPABASE:
+        return run_async(publish_listing_async(new_row, images))
+    
+    # Store images first, so the new listing never references a missing image
+    try:
+        stored_before: bool = store_images(images) if images else False
+    except Exception:
+        return {"error": "Error while trying to upload image to database"}, 400
+    
+    # try publishing new listing
+    try:
+        # Insert new listing
+        response_table = (
+            supabase.table("listings")
+            .insert(new_row)
+            .execute()
+        )
+    except Exception:
+        if images:
+            release_unused_image(new_row["image_hash"])
+        return {"error": "Error while trying to add to database"}, 400
+    
+    new_listing: dict = response_table.data[0]
+    listings_created([new_listing])
+    
+    if stored_before:
+        restore_images(images)
+
+    return new_listing, 201
+
+
+# async version of publishing a listing (insert + image upload) for create_listing()
+async def publish_listing_async(new_row: dict, images: dict | None):
+    # the uuid is chosen here instead of by the database, so the image upload does not
+    # have to wait for the insert and both requests run at the same time
+    uuid = str(uuidlib.uuid4())
+    
+    insert_result, store_result = await asyncio.gather(
+        async_supabase.table("listings").insert({**new_row, "uuid": uuid}).execute(),
+        store_images_async(images) if images else asyncio.sleep(0, False),
+        return_exceptions=True
+    )
+    
+    if isinstance(insert_result, Exception):
+        if images and not isinstance(store_result, Exception):
+            # the listing was not created, so its images must not stay in storage
+            try:
+                await release_image_async(new_row["image_hash"])
+            except Exception:
+                pass
+        return {"error": "Error while trying to add to database"}, 400
+    
+    if isinstance(store_result, Exception):
+        # same as the sync path: no listing without its image
+        try:
+            await async_supabase.table("listings").delete().eq("uuid", uuid).execute()
+        except Exception:
+            pass
+        return {"error": "Error while trying to upload image to database"}, 400
+    
+    new_listing: dict = insert_result.data[0]
+    listings_created([new_listing])
+    
+    if store_result:
+        try:
+            await store_images_async(images)
+        except Exception:
+            pass
+    
+    return new_listing, 201
+
+
+# releases the image of a listing that could not be created, a failure leaves an
+# unreferenced image behind that is released again by the next listing using it
+def release_unused_image(image_hash: str):
+    try:
+        release_image(image_hash)
+    except Exception:
+        pass
+
+
+# stores images again after their listing was inserted if they already existed before.
+# A listing deleted concurrently may have released them between the existence check and the insert.
+def restore_images(images: dict):
+    try:
+        store_images(images)
+    except Exception:
+        pass
+
+
+@api.put("/listings/<uuid>/image")
+def put_listing_image(uuid: str):
+    """
+    PUT /listings/<uuid>/image
+    
+    Add or replace the image of a listing. The image is processed like the image of POST /listings.
+    
+    Request Body
+    ------------
+    raw image bytes (image/png, image/jpeg, image/webp or image/gif)
+    OR multipart/form-data with the image as binary file part "image"
+    
+    Response
+    --------
+    200 - image stored:
+    {
+        "image_url": (str),
+        "thumbnail_url": (str)
+    }
+    
+    400 Bad Request:
+    {
+        "error": "Missing image" | "Invalid image" | "Unsupported image format" | "Image too large"
+    }
+    OR
+    {
+        "error": "Error while trying to upload image to database"
+    }
+    
+    404 - listing does not exist
+    413 - body larger than MAX_REQUEST_BYTES
+    """
+    
+    image_file = request_image_file()
+    if image_file is None:
+        return {"error": "Missing image"}, 400
+    
+    try:
+        listing: dict | None = select_listing(uuid)
+    except Exception:
+        return {"error": "Error while trying to read from database"}, 400
+    if listing is None:
+        return {"error": "listing does not exist"}, 404
+    
+    try:
+        with timed("ingest"):
+            images: dict = image_ingest_pool.submit(ingest_image, image_file).result()
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    image_hash: str = images_hash(images)
+    
+    try:
+        stored_before: bool = store_images(images)
+        # Reference the new image from the listing
+        response_table = (
+            supabase.table("listings")
+            .update({"image_hash": image_hash})
+            .eq("uuid", uuid)
+            .execute()
+        )
+    except Exception:
+        return {"error": "Error while trying to upload image to database"}, 400
+    
+    if len(response_table.data) == 0:
+        # deleted in the meantime
+        release_unused_image(image_hash)
+        return {"error": "listing does not exist"}, 404
+    
+    listings_cache.put_row(response_table.data[0])
+    if stored_before:
+        restore_images(images)
+    
+    # Release the replaced image
+    try:
+        if listing.get("image_hash"):
+            if listing["image_hash"] != image_hash:
+                release_image(listing["image_hash"])
+        else:
+            image_cache.remove(image_paths(listing))
+            supabase.storage.from_("images").remove(image_paths(listing))
+    except Exception:
+        pass
+    
+    updated: dict = response_table.data[0]
+    attach_image_urls([updated], set())
+    return {"image_url": updated["image_url"], "thumbnail_url": updated["thumbnail_url"]}, 200
+
+
+@api.post("/listings/duplicates:check")
+def check_duplicates():
+    """
+    POST /listings/duplicates:check
+    
+    Check many draft listings for potential duplicates at once, e.g. to pre-screen a bulk import.
+    Uses the same rule as POST /listings (see there), nothing is written.
+    
+    Request Body (application/json)
+    -------
+    {
+        "listings": [
+            {
+                "title": (str),
+                "room": (str),
+                "category": (str),
+                ...                         # further fields are ignored
+            },
+            ...
+        ]
+    }
+
+    Response
+    ---------
+    200 - one result per draft, in request order, matches ranked by title similarity:
+    {
+        "results": [
+            {
+                "duplicate": (bool),
+                "matches": [
+                    {
+                        "score": (float),   # Levenshtein ratio of the titles (0-100)
+                        "listing": { ... existing listing ... }
+                    },
+                    ...
+                ]
+            },
+            ...
+        ]
+    }
+
+    400 Bad Request:
+    {
+        "error": "Missing required fields"
+    }
+    OR
+    {
+        "error": "Error while trying to read from database"
+    }
+    """
+    
+    data_body: dict = request.get_json(silent=True) or {}
+    drafts = data_body.get("listings")
+    
+    if not isinstance(drafts, list) or not all(
+        isinstance(draft, dict) and all(isinstance(draft.get(key), str) and draft.get(key) for key in ["title", "room", "category"])
+        for draft in drafts
+    ):
+        return {"error": "Missing required fields"}, 400
+    if len(drafts) > DUPLICATE_CHECK_MAX_BATCH:
+        return {"error": f"At most {DUPLICATE_CHECK_MAX_BATCH} listings per request"}, 400
+    
+    try:
+        # get existing listings of every room and category occuring in the drafts
+        existing = []
+        for room, category in {(draft["room"], draft["category"]) for draft in drafts}:
+            existing.extend(select_listings(parse_listings_query({"room": room, "category": category})))
+    except Exception:
+        return {"error": "Error while trying to read from database"}, 400
+    
+    results = [
+        {
+            "duplicate": bool(matches),
+            "matches": [{"score": score, "listing": match} for match, score in matches]
+        }
+        for matches in find_duplicates(drafts, existing)
+    ]
+    
+    return {"results": results}, 200
+
+
+# helpers for duplicate detection
+# finds potential duplicates of many new listings among existing listings at once
+# returns one list of (existing listing, score) per new listing, ranked by score
+# a pair of the same room and category is a potential duplicate if the Levenshtein ratio of the titles is
+# above the threshold or the titles share a (synonym-expanded) word; all titles of a group are scored in one native call
+def find_duplicates(new_listings: list, existing_listings: list):
+    with timed("duplicates"):
+        results, comparisons = find_duplicates_grouped(new_listings, existing_listings)
+    metrics.inc("duplicate_comparisons_total", comparisons)
+    metrics.inc("duplicate_matches_total", sum(len(matches) for matches in results))
+    return results
+
+
+# scores the new listings against the existing listings of their room and category, see find_duplicates()
+# returns the matches per new listing and the number of compared pairs
+def find_duplicates_grouped(new_listings: list, existing_listings: list):
+    import numpy
+    from rapidfuzz.fuzz import ratio
+    from rapidfuzz.process import cdist
+    
+    results = [[] for _ in new_listings]
+    comparisons = 0
+    
+    # group by room and category, only listings within the same group can be duplicates
+    groups = {}
+    for i, new in enumerate(new_listings):
+        groups.setdefault((new.get("room"), new.get("category")), ([], []))[0].append(i)
+    for ex in existing_listings:
+        group = groups.get((ex.get("room"), ex.get("category")))
+        if group is not None:
+            group[1].append(ex)
+    
+    for new_indices, group_existing in groups.values():
+        if not group_existing:
+            continue
+        comparisons += len(new_indices) * len(group_existing)
+        
+        # Levenshtein ratio between all new and existing titles of the group
+        scores = cdist(
+            [new_listings[i]["title"].lower() for i in new_indices],
+            [ex["title"].lower() for ex in group_existing],
+            scorer=ratio,
+            dtype=numpy.float64,
+            workers=DUPLICATE_CHECK_WORKERS
+        )
+        
+        for row, i in enumerate(new_indices):
+            new_words = title_terms(new_listings[i]["title"])
+            for col, ex in enumerate(group_existing):
+                score = float(scores[row, col])
+                # similarity score above threshold or common words with synonyms
+                if score > 0.7 or new_words.intersection(title_terms(ex["title"])):
+                    results[i].append((ex, score))
+            results[i].sort(key=lambda match: match[1], reverse=True)
+    
+    return results, comparisons
+
+
+# helperfunktions for duplicate detection
+# normalized and synonym-expanded words of a title
+# computed once per distinct title instead of on every comparison
+@lru_cache(maxsize=65536)
+def title_terms(title: str):
+    return frozenset(expand_synonyms(normalize_words(title)))
+
+
+# helperfunktions for duplicate detection
+# split text into words and normalize them (lowercase)
+def normalize_words(text: str):
+    return [w.lower() for w in text.split()]
+
+
+# helperfunktions for duplicate detection
+# adds synonyms to a set of words using a predefined synonym dictionary
+# this helps to catch duplicates that use different words with similar meanings
+def expand_synonyms(words):
+    expanded = set(words)
+    for w in words:
+        expanded.update(SYNONYM_LOOKUP.get(w, ()))
+    return expanded
+
+
+
+@api.delete("/listings/<uuid>")
+def delete_listing(uuid: str):
+    """
+    DELETE /listings/<uuid>
+
+    Delete a single listing row by its uuid and remove its associated images from storage (if present and unused).
+
+    Parameters
+    ----------
+    uuid : str
+        UUID of the listing to delete.
+
+    Responses
+    ---------
+    200
+    """
+    
+    if ASYNC_SUPABASE:
+        return run_async(delete_listing_async(uuid))
+    
+    try:
+        # Delete listing row from table
+        response_table = supabase.table("listings").delete().eq("uuid", uuid).execute()
+    except Exception:
+        return {"error": "Error while trying to delete from database"}, 400
+    
+    listings_deleted([uuid])
+        
+    try:
+        # Delete according image from storage, shared images only if no other listing uses them
+        for row in response_table.data:
+            if row.get("image_hash"):
+                release_image(row["image_hash"])
+            else:
+                supabase.storage.from_("images").remove(image_paths(row))
+    except Exception:
+        return {"error": "Error while trying to delete image from database"}, 400
+
+    return {}, 200
+
+
+# async version of delete_listing(), deletes the row and removes an image stored by uuid at the same time.
+# A content-addressed image is released after the row is gone, as its reference count depends on it.
+async def delete_listing_async(uuid: str):
+    delete_result, remove_result = await asyncio.gather(
+        async_supabase.table("listings").delete().eq("uuid", uuid).execute(),
+        async_supabase.storage.from_("images").remove(image_paths({"uuid": uuid})),
+        return_exceptions=True
+    )
+    
+    if isinstance(delete_result, Exception):
+        return {"error": "Error while trying to delete from database"}, 400
+    
+    listings_deleted([uuid])
+    
+    if isinstance(remove_result, Exception):
+        return {"error": "Error while trying to delete image from database"}, 400
+    
+    try:
+        for row in delete_result.data:
+            if row.get("image_hash"):
+                await release_image_async(row["image_hash"])
+    except Exception:
+        return {"error": "Error while trying to delete image from database"}, 400
+    
+    return {}, 200
+
+
+@api.post("/listings:batch")
+def create_listings_batch():
+    """
+    POST /listings:batch
+    
+    Create many listings at once, e.g. when re-importing the items of the lost-and-found box.
+    
+    All listings are checked for duplicates together, against existing listings and against
+    listings earlier in the same batch (same rule as POST /listings). Listings without
+    duplicates are inserted with one multi-row insert, their images are uploaded in parallel.
+    
+    Query Parameters
+    ----------------
+    force : bool (optional)
+        - If set to true, skips the duplicate check.
+    
+    Request Body (application/json)
+    -------
+    {
+        "listings": [
+            { ... same fields as POST /listings ... },
+            ...
+        ]
+    }
+    
+    Response
+    ---------
+    200 - one result per listing, in request order:
+    {
+        "results": [
+            {"status": 201, "listing": { ... created listing ... }}
+            OR
+            {"status": 409, "duplicate": true, "matches": [ ... existing listings ... ], "batch_matches": [(int)]}
+            OR
+            {"status": 400, "error": (str)}
+        ]
+    }
+    `batch_matches` are the indices of earlier listings of the batch this listing duplicates.
+    
+    400 Bad Request:
+    {
+        "error": "Missing listings" | "At most <LISTINGS_MAX_BATCH> listings per request"
+    }
+    OR
+    {
+        "error": "Error while trying to read from database"
+    }
+    """
+    
+    data_body: dict = request.get_json(silent=True) or {}
+    items = data_body.get("listings")
+    
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return {"error": "Missing listings"}, 400
+    if len(items) > LISTINGS_MAX_BATCH:
+        return {"error": f"At most {LISTINGS_MAX_BATCH} listings per request"}, 400
+    
+    results: list = [None] * len(items)
+    rows: dict = {}
+    for i, item in enumerate(items):
+        try:
+            rows[i] = new_listing_row(item)
+        except ValueError as e:
+            results[i] = {"status": 400, "error": str(e)}
+    
+    # validate and scale down the images off the request thread while duplicates are checked
+    ingested_images = {
+        i: image_ingest_pool.submit(ingest_b64_image, items[i]["b64_image"])
+        for i in rows if items[i].get("b64_image")
+    }
+    
+    if request.args.get("force") != "true":
+        drafts = [rows[i] for i in rows]
+        try:
+            existing = []
+            for room, category in {(draft["room"], draft["category"]) for draft in drafts}:
+                existing.extend(select_listings(parse_listings_query({"room": room, "category": category})))
+        except Exception:
+            for future in ingested_images.values():
+                future.cancel()
+            return {"error": "Error while trying to read from database"}, 400
+        
+        # one duplicate check for the whole batch: against existing listings and the batch itself
+        batch_index = {id(draft): i for i, draft in zip(rows, drafts)}
+        matches = find_duplicates(drafts, existing)
+        # pairs within the batch are not counted in the duplicate metrics, every draft also matches itself
+        batch_matches, _ = find_duplicates_grouped(drafts, drafts)
+        for i, draft_matches, draft_batch_matches in zip(list(rows), matches, batch_matches):
+            # only earlier listings still accepted, rejected ones are not created
+            earlier = sorted(
+                j for j in (batch_index[id(match)] for match, _ in draft_batch_matches) if j < i and j in rows
+            )
+            if draft_matches or earlier:
+                results[i] = {
+                    "status": 409,
+                    "duplicate": True,
+                    "matches": [match for match, _ in draft_matches],
+                    "batch_matches": earlier
+                }
+                del rows[i]
+                if i in ingested_images:
+                    ingested_images.pop(i).cancel()
+    
+    images: dict = {}
+    with timed("ingest"):
+        for i, future in ingested_images.items():
+            try:
+                images[i] = future.result()
+                rows[i]["image_hash"] = images_hash(images[i])
+            except ValueError as e:
+                results[i] = {"status": 400, "error": str(e)}
+                del rows[i]
+    
+    # Store images in parallel, listings whose image failed are not inserted
+    stored_before: dict = {}
+    for i, stored in zip(list(images), image_fetch_pool.map(store_images_or_error, images.values())):
+        if isinstance(stored, Exception):
+            results[i] = {"status": 400, "error": "Error while trying to upload image to database"}
+            del rows[i]
+        else:
+            stored_before[i] = stored
+    
+    if rows:
         try:
-            # Download according image and add to listing if present
-            image_bin: bytes = (
-                supabase.storage
-                .from_("images")
-                .download(f"{listing['uuid']}.png")
+            # Insert all new listings at once, rows come back in insert order
+            response_table = (
+                supabase.table("listings")
+                .insert([{"image_hash": None, **row} for row in rows.values()])
+                .execute()
             )
-            listing["b64_image"] = "data:image/png;base64," + base64.b64encode(image_bin).decode('utf-8')
         except Exception:
-            pass
-        
-    except Exception:
-        return {"error": "Error while trying to read from database"}, 400
-
-    return listing, 200
+            for i, row in rows.items():
+                results[i] = {"status": 400, "error": "Error while trying to add to database"}
+            for image_hash in {row["image_hash"] for row in rows.values() if row.get("image_hash")}:
+                release_unused_image(image_hash)
+        else:
+            listings_created(response_table.data)
+            for i, new_listing in zip(rows, response_table.data):
+                results[i] = {"status": 201, "listing": new_listing}
+                if stored_before.get(i):
+                    restore_images(images[i])
+    
+    return {"results": results}, 200
 
 
-@app.post("/listings")
-def create_listing():
+@api.delete("/listings:batch")
+def delete_listings_batch():
     """
-    POST /listings
+    DELETE /listings:batch
     
+    Delete many listings at once, with one database delete and one storage removal for all of them.
+    Shared images are only removed if no remaining listing uses them.
     
-    Creates a new listing entry and optionally uploads an associated PNG image.
-    Before insertion, the API checks for potential duplicates unless the request
-    is forced via the query parameter `?force=true`.
-
-    Duplicate Detection
-    -------------------
-    A listing is considered a potential duplicate if:
-
-    - The **room** is identical, AND
-    - The **category** is identical, AND
-    - EITHER:
-        • The title similarity (Levenshtein ratio) > 0.7, OR
-        • The normalized and synonym-expanded word sets share at least one common term.
-
-    If duplicates are detected and `force=true` is not provided,
-    the operation is aborted and a 409 response is returned.
-
-    Query Parameters
-    ----------------
-    force : bool (optional)
-        - If set to true, skips the duplicate check.
-        Example: POST /listings?force=true
-
     Request Body (application/json)
     -------
-    JSON body (application/json)
     {
-        "type": (str),
-        "created_at": (str) - "YYYY-MM-DD",
-        "title": (str),
-        "description": (str),
-        "room": (str),
-        "category": (str),
-        "contact_email": (str | null),
-        "b64_image": (str | null)        # "data:image/png;base64,...."
+        "uuids": [(str), ...]
     }
-
+    
     Response
     ---------
-    201 - the newly created listing object:
+    200 - one result per uuid, in request order:
     {
-        "uuid": (str)
-        "type": (str),
-        "created_at": (str),
-        "title": (str),
-        "description": (str),
-        "room": (str),
-        "category": (str),
-        "contact_email": (str | null)
+        "results": [
+            {"uuid": (str), "status": 200}
+            OR
+            {"uuid": (str), "status": 404, "error": "listing does not exist"}
+            OR
+            {"uuid": (str), "status": 400, "error": (str)}
+        ]
     }
-
+    
     400 Bad Request:
     {
-        "error": "Missing required fields"
+        "error": "Missing uuids" | "At most <LISTINGS_MAX_BATCH> listings per request"
     }
     OR
     {
-        "error": "Error while trying to add to database"
-    }
-
-    409 Conflict – Duplicate detected:
-    {
-        "duplicate": true,
-        "matches": [ ... existing listings ... ]
+        "error": "Error while trying to delete from database"
     }
     """
     
-    data_body: dict = request.get_json()
-
-    type: str | None = data_body.get("type")
-
-    created_at: str | None = data_body.get("created_at")
-    if created_at:
-        created_at = datetime.strptime(created_at, "%Y-%m-%d").isoformat()
+    data_body: dict = request.get_json(silent=True) or {}
+    uuids = data_body.get("uuids")
     
-    title: str | None = data_body.get("title")
-    description: str | None = data_body.get("description")
-    room: str | None = data_body.get("room")
-    category: str | None = data_body.get("category")
-    contact_email: str | None = data_body.get("contact_email")
-    b64_image: str | None = data_body.get("b64_image")
-
-    if not all([type, created_at, title, description, room, category]):
-        return {"error": "Missing required fields"}, 400
+    if not isinstance(uuids, list) or not uuids or not all(isinstance(uuid, str) for uuid in uuids):
+        return {"error": "Missing uuids"}, 400
+    if len(uuids) > LISTINGS_MAX_BATCH:
+        return {"error": f"At most {LISTINGS_MAX_BATCH} listings per request"}, 400
     
+    # malformed uuids would fail the whole delete, the database returns uuids lowercased
+    valid_uuids = list({uuid.lower() for uuid in uuids if UUID_PATTERN.fullmatch(uuid.lower())})
     
-    # duplikates check
-    # if force query param is not set to true, check for potential duplicates. If any found, stop execution and return them.
-    force = request.args.get("force") == "true"
-
-    if not force:
-        # get all existing listings
-        existing = supabase.table("listings").select("*").execute().data
-
-        duplicates = []
-        # check for potential duplicates
-        for ex in existing:
-            if is_potential_duplicate(data_body, ex):
-                duplicates.append(ex)
-
-        if duplicates:
-            # stop execution and return found duplicates
-            return {
-                "duplicate": True,
-                "matches": duplicates
-            }, 409
-        
-        
-    # try publishing new listing
     try:
-        # Insert new listing
-        response_table = (
+        # Delete listing rows from table
+        deleted: list = (
             supabase.table("listings")
-            .insert({
-                "created_at": created_at,
-                "type": type,
-                "title": title,
-                "description": description,
-                "room": room,
-                "category": category,
-                "contact_email": contact_email
-            })
+            .delete()
+            .in_("uuid", valid_uuids)
             .execute()
-        )
+            .data
+        ) if valid_uuids else []
     except Exception:
-        return {"error": "Error while trying to add to database"}, 400
+        return {"error": "Error while trying to delete from database"}, 400
     
-    new_listing: dict = response_table.data[0]
+    listings_deleted([row["uuid"] for row in deleted])
     
+    image_error = None
     try:
-        if b64_image:
-            # Upload image to storage with uuid as name
-            supabase.storage.from_("images") \
-                .upload(
-                    file=base64.b64decode(b64_image.split("base64,")[1]),
-                    path=f"{new_listing['uuid']}.png",
-                    file_options={"content-type": "image/png"}
-                )
+        # Delete according images from storage: images stored by uuid and images no remaining listing uses
+        paths = [path for row in deleted if not row.get("image_hash") for path in image_paths(row)]
+        hashes = list({row["image_hash"] for row in deleted if row.get("image_hash")})
+        if hashes:
+            referenced = {
+                row["image_hash"] for row in
+                supabase.table("listings").select("image_hash").in_("image_hash", hashes).execute().data
+            }
+            for image_hash in hashes:
+                if image_hash not in referenced:
+                    paths.extend([blob_path(image_hash, "full"), blob_path(image_hash, "thumb")])
+        if paths:
+            image_cache.remove(paths)
+            supabase.storage.from_("images").remove(paths)
     except Exception:
-        return {"error": "Error while trying to upload image to database"}, 400
+        image_error = "Error while trying to delete image from database"
+    
+    deleted_uuids = {row["uuid"] for row in deleted}
+    results = []
+    for uuid in uuids:
+        if not UUID_PATTERN.fullmatch(uuid.lower()):
+            results.append({"uuid": uuid, "status": 400, "error": "Invalid uuid"})
+        elif uuid.lower() not in deleted_uuids:
+            results.append({"uuid": uuid, "status": 404, "error": "listing does not exist"})
+        elif image_error is not None:
+            results.append({"uuid": uuid, "status": 400, "error": image_error})
+        else:
+            results.append({"uuid": uuid, "status": 200})
+    
+    return {"results": results}, 200
 
-    return new_listing, 201
 
+# helpers for batch requests
+# builds the row of a new listing from the fields of a POST /listings body, raises ValueError if invalid
+def new_listing_row(data_body: dict):
+    row = {key: data_body.get(key) for key in ["type", "created_at", "title", "description", "room", "category"]}
+    if not all(isinstance(value, str) and value for value in row.values()):
+        raise ValueError("Missing required fields")
+    try:
+        row["created_at"] = datetime.strptime(row["created_at"], "%Y-%m-%d").isoformat()
+    except ValueError:
+        raise ValueError("Invalid created_at")
+    row["contact_email"] = data_body.get("contact_email")
+    return row
 
-# helpers for duplicate detection
-# checks if two titles are similar enough to be considered duplicates
-# using Levenshtein distance and word matching with synonyms
-def is_potential_duplicate(new, existing):
 
-    # Exact match on room and category required
-    if new.get("room") != existing.get("room"):
-        return False
-    if new.get("category") != existing.get("category"):
-        return False
+# store_images() for the storage pool, returns the exception instead of raising it
+def store_images_or_error(images: dict):
+    try:
+        return store_images(images)
+    except Exception as e:
+        return e
 
-    # check Levenshtein ratio between titles
-    score = ratio(new["title"].lower(), existing["title"].lower())
 
-    # check wether similarity score is above threshold
-    if score > 0.7:
-        return True
+# helpers for the async request path
+# creates the async Supabase client, has to run on the event loop it is used on
+async def create_async_supabase():
+    from supabase import acreate_client, AsyncClientOptions
+    
+    async_http_client = httpx.AsyncClient(
+        timeout=SUPABASE_TIMEOUT,
+        transport=AsyncInstrumentedTransport(http2=True, limits=http_limits)
+    )
+    return await acreate_client(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        options=AsyncClientOptions(httpx_client=async_http_client)
+    )
 
-    # compare words in titles with synonyms
-    new_words = expand_synonyms(normalize_words(new["title"]))
-    ex_words = expand_synonyms(normalize_words(existing["title"]))
 
-    if new_words.intersection(ex_words):
-        return True
+# returns the event loop of the async request path, starts it (and the async client) on first use
+def get_async_loop():
+    global async_loop, async_supabase
+    
+    with async_loop_lock:
+        if async_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="supabase-async", daemon=True).start()
+            async_supabase = asyncio.run_coroutine_threadsafe(create_async_supabase(), loop).result()
+            async_loop = loop
+    return async_loop
 
-    return False
 
+# runs a coroutine on the event loop of the async request path and waits for its result.
+# The request thread only waits once for all Supabase requests of the coroutine, which
+# run concurrently on the loop instead of one after another on the request thread.
+# `phase` names the time spent waiting in the timings of the request, see record_timing().
+def run_async(coroutine, phase: str = "supabase"):
+    with timed(phase):
+        return asyncio.run_coroutine_threadsafe(coroutine, get_async_loop()).result()
 
-# helperfunktions for duplicate detection
-# split text into words and normalize them (lowercase)
-def normalize_words(text: str):
-    return [w.lower() for w in text.split()]
 
+# helpers for keeping in-process state in sync with the "listings" table
+# applies created listings to cache, index and change log (which notifies the change feed)
+def listings_created(rows: list):
+    rows = [row for row in rows if not change_log.is_recorded("create", row["uuid"])]
+    for row in rows:
+        listings_cache.put_row(row)
+        listings_index.add(row)
+    change_log.record("create", rows)
 
-# helperfunktions for duplicate detection
-# adds synonyms to a set of words using a predefined synonym dictionary
-# this helps to catch duplicates that use different words with similar meanings
-def expand_synonyms(words):
-    expanded = set(words)
-    for w in words:
-        if w in SYNONYMS:
-            expanded.update(SYNONYMS[w])
-    return expanded
 
+# applies deleted listings to cache, index and change log (which notifies the change feed)
+def listings_deleted(uuids):
+    uuids = [uuid for uuid in uuids if not change_log.is_recorded("delete", uuid)]
+    listings_cache.remove_rows(uuids)
+    image_cache.remove([path for uuid in uuids for path in image_paths({"uuid": uuid})])
+    listings_index.remove(uuids)
+    change_log.record("delete", [{"uuid": uuid} for uuid in uuids])
 
 
-@app.delete("/listings/<uuid>")
-def delete_listing(uuid: str):
+# listens to inserts and deletes on the "listings" table via Supabase Realtime,
+# so changes made by other processes reach cache, index and change feed of this one
+def start_realtime_listener():
+    from realtime import AsyncRealtimeClient
+    
+    def on_change(payload):
+        data = payload["data"]
+        if data["type"] == "INSERT":
+            listings_created([data["record"]])
+        elif data["type"] == "DELETE":
+            listings_deleted([data["old_record"]["uuid"]])
+    
+    async def listen():
+        client = AsyncRealtimeClient(f"{SUPABASE_URL}/realtime/v1", SUPABASE_KEY, auto_reconnect=True)
+        await client.connect()
+        channel = client.channel("listings-changes")
+        await channel.on_postgres_changes("*", table="listings", callback=on_change).subscribe()
+        # the client receives messages in its own task, keep the loop running
+        await asyncio.Event().wait()
+    
+    threading.Thread(target=asyncio.run, args=(listen(),), name="realtime-listener", daemon=True).start()
+
+
+@api.get("/cache/stats")
+def get_cache_stats():
     """
-    DELETE /listings/<uuid>
+    GET /cache/stats
+    
+    Return hit, miss and eviction counters of the in-process listings and image caches,
+    and how many reads were shared with a concurrent identical read ("reads").
+    
+    Response
+    --------
+    200:
+    {
+        "listings": {"enabled": (bool), "hits": (int), "stale_hits": (int), "misses": (int), "evictions": (int), "rows": (int), "queries": (int)},
+        "images": {"enabled": (bool), "hits": (int), "misses": (int), "evictions": (int), "images": (int), "bytes": (int)},
+        "reads": {"in_flight": (int), "started": (int), "shared": (int), "refreshes": (int)}
+    }
+    """
+    
+    return {
+        "listings": listings_cache.stats(),
+        "images": image_cache.stats(),
+        "reads": single_flight.stats()
+    }, 200
 
-    Delete a single listing row by its uuid and remove its associated PNG image from storage (if present).
 
+def delete_old_listings(older_than_days: int = RETENTION_DAYS, dry_run: bool = RETENTION_DRY_RUN):
+    """
+    Delete all listings, older than given number of days, together with their images.
+    
+    Expired listings are selected in pages of RETENTION_BATCH_SIZE and deleted page by page.
+    Every Supabase request is retried, a page that still fails is counted and skipped, so
+    the next run picks its listings up again. Images left behind by a failure are removed
+    by sweep_orphaned_images(). Only deletions confirmed by Supabase reach the change feed
+    and the search index, expired rows of failed pages are just evicted from the cache.
+    
     Parameters
     ----------
-    uuid : str
-        UUID of the listing to delete.
-
-    Responses
-    ---------
-    200
+    older_than_days : int
+    dry_run : bool
+        Only count the listings that would be deleted.
+    
+    Returns
+    -------
+    dict
+        Metrics of the run, see GET /retention/stats.
     """
     
-    try:
-        # Delete listing row from table
-        supabase.table("listings").delete().eq("uuid", uuid).execute()
-    except Exception:
-        return {"error": "Error while trying to delete from database"}, 400
+    run = start_retention_run("retention", dry_run)
+    cutoff_date = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+    after = None
+    
+    while True:
+        try:
+            page = with_retries(lambda: select_expired_listings(cutoff_date, after))
+        except Exception as e:
+            retention_failure(run, "selecting expired listings", e)
+            break
+        if not page:
+            break
+        # keyset pagination, also skips listings of a failed page
+        after = page[-1]["uuid"]
         
-    try:
-        # Delete according image from storage
-        supabase.storage.from_("images").remove([f"{uuid}.png"])
-    except Exception:
-        return {"error": "Error while trying to delete image from database"}, 400
+        try:
+            delete_expired_listings(page, run)
+        except Exception as e:
+            retention_failure(run, f"deleting {len(page)} expired listings", e)
+        
+        if len(page) < RETENTION_BATCH_SIZE:
+            break
+    
+    if not dry_run:
+        # Cached rows the deletions did not report were deleted by another process or their page
+        # failed, so they are only evicted from the cache. Change log and index only learn about
+        # confirmed deletions, the index resync drops listings deleted elsewhere.
+        listings_cache.remove_rows(listings_cache.uuids_created_before(cutoff_date))
+    
+    return finish_retention_run(run, f"listings older than {older_than_days} days")
 
-    return {}, 200
+
+# returns a page of (uuid, image_hash) of listings created before the cutoff, ordered by uuid
+def select_expired_listings(cutoff_date: str, after: str | None):
+    query = supabase.table("listings").select("uuid", "image_hash").lt("created_at", cutoff_date)
+    if after is not None:
+        query = query.gt("uuid", after)
+    return query.order("uuid").limit(RETENTION_BATCH_SIZE).execute().data
+
+
+# deletes a page of expired listings and their images (or only counts them in a dry run)
+def delete_expired_listings(page: list, run: dict):
+    if run["dry_run"]:
+        run["rows_deleted"] += len(page)
+        return
+    
+    uuids = [row["uuid"] for row in page]
+    deleted = with_retries(lambda: supabase.table("listings").delete().in_("uuid", uuids).execute()).data
+    listings_deleted([row["uuid"] for row in deleted])
+    run["rows_deleted"] += len(deleted)
+    
+    # images stored by uuid belong to exactly one listing, shared images are released
+    paths = [path for row in deleted if not row.get("image_hash") for path in image_paths(row)]
+    removed = with_retries(lambda: supabase.storage.from_("images").remove(paths)) if paths else []
+    for image_hash in {row["image_hash"] for row in deleted if row.get("image_hash")}:
+        removed.extend(with_retries(release_image, image_hash))
+    count_removed_images(run, removed)
 
 
-def delete_old_listings(older_than_days: int = 14):
+def sweep_orphaned_images(dry_run: bool = RETENTION_DRY_RUN):
     """
-    Delete all listings, older than given number of days.
+    Remove images that no listing row refers to, e.g. left behind by failed deletions.
+    
+    Lists the images bucket folder by folder and looks up the owners of its objects in pages
+    of RETENTION_BATCH_SIZE. Objects younger than ORPHAN_GRACE_SECONDS are kept, they may
+    belong to a listing that is being created right now. Objects not named like images of
+    this app are never touched.
     
     Parameters
     ----------
-    older_than_days : int
+    dry_run : bool
+        Only count the images that would be removed.
+    
+    Returns
+    -------
+    dict
+        Metrics of the run, see GET /retention/stats.
     """
     
+    run = start_retention_run("orphan_sweep", dry_run)
+    grace_cutoff = datetime.now(timezone.utc) - timedelta(seconds=ORPHAN_GRACE_SECONDS)
+    
+    for folder in ["", "thumbs", "sha256"]:
+        try:
+            objects = with_retries(list_image_objects, folder)
+        except Exception as e:
+            retention_failure(run, f"listing images in '{folder}'", e)
+            continue
+        
+        candidates = [
+            obj for obj in objects
+            if obj.get("id") is not None and orphan_key(folder, obj["name"]) is not None
+            and is_created_before(obj, grace_cutoff)
+        ]
+        for start in range(0, len(candidates), RETENTION_BATCH_SIZE):
+            batch = candidates[start:start + RETENTION_BATCH_SIZE]
+            try:
+                remove_orphaned_images(folder, batch, run)
+            except Exception as e:
+                retention_failure(run, f"sweeping {len(batch)} images in '{folder}'", e)
+    
+    return finish_retention_run(run, "images without listing")
+
+
+# uuid (folders "" and "thumbs") or hash (folder "sha256") of the listing an image object belongs to,
+# None for objects this app did not store
+def orphan_key(folder: str, name: str):
+    if folder == "sha256":
+        key = name.removesuffix("-thumb")
+        return key if IMAGE_HASH_PATTERN.fullmatch(key) else None
+    key = name.removesuffix(".png")
+    return key if name.endswith(".png") and UUID_PATTERN.fullmatch(key) else None
+
+
+# checks whether a storage object was created before the given time (unknown age counts as recent)
+def is_created_before(obj: dict, before: datetime):
     try:
-        cutoff_date = (datetime.now() - timedelta(days=older_than_days)).isoformat()
-        # Delete rows created before from table
-        supabase.table("listings").delete().lt("created_at", cutoff_date).execute()
-        print(f"[INFO] {datetime.now().isoformat()} : Deleted listings older than {older_than_days} days.")
-    except Exception:
-        pass
+        return datetime.fromisoformat(obj["created_at"]) < before
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+# removes the objects of a folder whose listing does not exist (or only counts them in a dry run)
+def remove_orphaned_images(folder: str, objects: list, run: dict):
+    column = "image_hash" if folder == "sha256" else "uuid"
+    keys = list({orphan_key(folder, obj["name"]) for obj in objects})
+    rows = with_retries(lambda: supabase.table("listings").select(column).in_(column, keys).execute()).data
+    owned = {row[column] for row in rows}
     
+    orphans = [obj for obj in objects if orphan_key(folder, obj["name"]) not in owned]
+    if not orphans:
+        return
+    if run["dry_run"]:
+        count_removed_images(run, orphans)
+        return
+    
+    paths = [f"{folder}/{obj['name']}" if folder else obj["name"] for obj in orphans]
+    image_cache.remove(paths)
+    count_removed_images(run, with_retries(lambda: supabase.storage.from_("images").remove(paths)))
+
+
+# helpers for retention runs
+# listing uuids (generated by Postgres)
+UUID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+# metrics of the last runs of delete_old_listings() and sweep_orphaned_images(), newest last
+retention_runs: deque = deque(maxlen=RETENTION_HISTORY_SIZE)
+
+
+# calls fn(*args), retrying it RETENTION_RETRIES times with exponential backoff if it raises
+def with_retries(fn, *args):
+    for attempt in range(RETENTION_RETRIES + 1):
+        try:
+            return fn(*args)
+        except Exception:
+            if attempt == RETENTION_RETRIES:
+                raise
+            time.sleep(RETENTION_RETRY_DELAY * 2 ** attempt)
+
+
+def start_retention_run(job: str, dry_run: bool):
+    return {
+        "job": job,
+        "dry_run": dry_run,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "duration_s": None,
+        "rows_deleted": 0,
+        "images_deleted": 0,
+        "bytes_reclaimed": 0,
+        "failures": 0,
+        "errors": [],
+        "_started": time.perf_counter()
+    }
+
+
+def count_removed_images(run: dict, objects: list):
+    run["images_deleted"] += len(objects)
+    run["bytes_reclaimed"] += sum((obj.get("metadata") or {}).get("size", 0) for obj in objects)
+
+
+def retention_failure(run: dict, action: str, error: Exception):
+    run["failures"] += 1
+    # keep the first errors only, a broken connection fails every page the same way
+    if len(run["errors"]) < 10:
+        run["errors"].append(f"{action}: {error}")
+    print(f"[ERROR] {datetime.now().isoformat()} : {run['job']} failed {action}: {error}")
+
+
+def finish_retention_run(run: dict, what: str):
+    run["duration_s"] = round(time.perf_counter() - run.pop("_started"), 3)
+    retention_runs.append(run)
+    print(
+        f"[INFO] {datetime.now().isoformat()} : {'Dry run, would have deleted' if run['dry_run'] else 'Deleted'} "
+        f"{run['rows_deleted']} listings and {run['images_deleted']} images ({run['bytes_reclaimed']} bytes) "
+        f"of {what} in {run['duration_s']}s, {run['failures']} failures."
+    )
+    return run
+
+
+@api.get("/retention/stats")
+def get_retention_stats():
+    """
+    GET /retention/stats
+    
+    Return the metrics of the last retention runs (deletion of old listings and sweeps for
+    images without listing) of this process, newest last.
+    
+    Response
+    --------
+    200:
+    {
+        "runs": [
+            {
+                "job": "retention" | "orphan_sweep",
+                "dry_run": (bool),
+                "started_at": (str),
+                "duration_s": (float),
+                "rows_deleted": (int),
+                "images_deleted": (int),
+                "bytes_reclaimed": (int),
+                "failures": (int),
+                "errors": [(str)]
+            }
+        ]
+    }
+    """
+    
+    return {"runs": list(retention_runs)}, 200
+
+
+@api.cli.command("retention")
+@click.option("--dry-run", is_flag=True, help="Only count what would be deleted.")
+@click.option("--sweep", is_flag=True, help="Also remove images without listing.")
+@click.option("--days", type=int, default=RETENTION_DAYS, show_default=True, help="Delete listings older than this.")
+def retention_command(dry_run: bool, sweep: bool, days: int):
+    """Run the retention job now (flask --app src.app retention)."""
+    
+    runs = [delete_old_listings(days, dry_run=dry_run)]
+    if sweep:
+        runs.append(sweep_orphaned_images(dry_run=dry_run))
+    print(json.dumps(runs, indent=4))
+    
+    
+def start_scheduler():
+    """
+    Start the daily cleanup in this process, unless another process on this host already runs it.
+    
+    Server processes compete for an exclusive lock on SCHEDULER_LOCK_FILE, the winner runs the
+    scheduler and holds the lock until it exits. Then the lock is free again for the next process
+    started (e.g. the worker replacing it).
+    
+    Returns
+    -------
+    BackgroundScheduler | None
+        The started scheduler, or None if another process runs it.
+    """
+    
+    global scheduler_lock
+    
+    lock_file = open(SCHEDULER_LOCK_FILE, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    # keep the file open, closing it would release the lock
+    scheduler_lock = lock_file
+    
+    from apscheduler.schedulers.background import BackgroundScheduler
     
-if __name__ == "__main__":
     scheduler = BackgroundScheduler()
     scheduler.add_job(delete_old_listings, "cron", hour=7, minute=00, timezone="Europe/Berlin")
+    scheduler.add_job(sweep_orphaned_images, "interval", hours=ORPHAN_SWEEP_INTERVAL_HOURS)
     scheduler.start()
+    return scheduler
+
+
+scheduler_lock = None
+
+
+def start_background_tasks():
+    """
+    Start everything a server process runs besides handling requests.
+    Called once per process, by __main__ below or by the worker hook in gunicorn.conf.py.
+    """
+    
+    start_scheduler()
+    
+    # build the search and matching index in the background instead of on the first request,
+    # this also creates the Supabase client (see LazyClient) before a request has to wait for it
+    threading.Thread(target=listings_index.ensure_built, daemon=True).start()
+    
+    if SUPABASE_REALTIME_ENABLED:
+        start_realtime_listener()
+
+
+def create_app(config: dict | None = None):
+    """
+    Create the Flask app serving the API.
+    
+    Creating an app is cheap and needs no credentials: the Supabase client is created on first
+    use (see LazyClient). Apps of one process share its caches, index, pools and Supabase client.
+    
+    Parameters
+    ----------
+    config : dict | None
+        Flask configuration applied over the defaults, e.g. {"TESTING": True}.
+        FRONTEND_ENDPOINT is the origin allowed by CORS (default: FRONTEND_ENDPOINT environment variable),
+        without it no cross-origin requests are allowed.
+    
+    Returns
+    -------
+    Flask
+    """
+    
+    app = Flask(__name__)
+    app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+    app.config["FRONTEND_ENDPOINT"] = FRONTEND_ENDPOINT
+    app.config.update(config or {})
+    app.json = TimedJSONProvider(app)
+    origins = [app.config["FRONTEND_ENDPOINT"]] if app.config["FRONTEND_ENDPOINT"] else []
+    CORS(app, origins=origins, expose_headers=["ETag", "Last-Modified", "X-Listings-Version"])
+    app.register_blueprint(api)
+    return app
+
+
+# the app run by gunicorn (src.app:app) and the development server
+app: Flask = create_app()
+
+
+if __name__ == "__main__":
+    # development server, see gunicorn.conf.py for production
+    start_background_tasks()
     
-    app.run(host="0.0.0.0", port=PORT)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=PORT)
@@ -1,10 +1,18 @@
+import base64
+import gzip
+import io
+import json
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
 import pytest
+from PIL import Image
 
 # Ensure project root is on sys.path so the top-level package 'src' is importable when running tests
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from src.app import app, delete_old_listings
+from src.app import ImageCache, ListingsCache, app, change_log, create_app, delete_old_listings, fetch_listings, listings_cache, listings_index, metrics, supabase
 
 
 @pytest.fixture(autouse=True)
@@ -105,6 +113,39 @@ def test_delete_old_listings():
         assert getr.status_code == 404
 
 
+def test_delete_old_listings_failed_delete(monkeypatch):
+    # Listings a failed page did not delete stay in the index and are not published as deleted
+    with app.test_client() as client:
+        old = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "title": "Old Undeletable Listing",
+            "description": "Its deletion fails.",
+            "room": "Room C",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": None
+        }
+        post = client.post("/listings?force=true", json=old)
+        uuid = post.get_json()["uuid"]
+        assert client.get(f"/listings/{uuid}").status_code == 200
+        listings_index.ensure_built()
+
+        def failing_delete(page, run):
+            raise RuntimeError("delete failed")
+
+        monkeypatch.setattr("src.app.delete_expired_listings", failing_delete)
+        run = delete_old_listings()
+        assert run["failures"] >= 1
+        assert uuid in listings_index.entries
+        assert not change_log.is_recorded("delete", uuid)
+        assert client.get(f"/listings/{uuid}").status_code == 200
+
+        monkeypatch.undo()
+        delete_old_listings()
+        assert client.get(f"/listings/{uuid}").status_code == 404
+
+
 def test_delete_listing():
     # Create a listing and ensure it can be deleted explicitly
     with app.test_client() as client:
@@ -135,3 +176,734 @@ def test_delete_listing_wrong_uuid():
     with app.test_client() as client:
         resp = client.delete("/listings/non-existent-uuid")
         assert resp.status_code == 400
+
+
+def test_get_listings_image_urls():
+    # With images=url the listings carry image URLs instead of inline base64 images
+    with app.test_client() as client:
+        resp = client.get("/listings?images=url")
+        assert resp.status_code == 200
+        for listing in resp.get_json():
+            assert "b64_image" not in listing
+            assert "image_url" in listing
+            assert "thumbnail_url" in listing
+
+
+def test_get_listings_invalid_images_mode():
+    # An unknown images mode should be rejected
+    with app.test_client() as client:
+        resp = client.get("/listings?images=invalid")
+        assert resp.status_code == 400
+
+
+def test_get_listing_image_missing():
+    # Requesting the image of a listing without image should return 404
+    with app.test_client() as client:
+        resp = client.get("/listings/non-existent-uuid/image")
+        assert resp.status_code == 404
+
+
+def test_get_listings_paginated():
+    # Paginated requests return pages of at most `limit` listings and a cursor for the next page
+    with app.test_client() as client:
+        resp = client.get("/listings?limit=2&images=none")
+        assert resp.status_code == 200
+        page = resp.get_json()
+        assert len(page["listings"]) <= 2
+        assert "next_cursor" in page
+
+        if page["next_cursor"]:
+            resp = client.get(f"/listings?limit=2&images=none&after={page['next_cursor']}")
+            assert resp.status_code == 200
+            next_page = resp.get_json()
+            # pages must not overlap
+            uuids = {listing["uuid"] for listing in page["listings"]}
+            assert not uuids.intersection(listing["uuid"] for listing in next_page["listings"])
+
+
+def test_get_listings_streamed():
+    # Streamed listings should match the regular response, as JSON array and as NDJSON
+    with app.test_client() as client:
+        expected = client.get("/listings", query_string={"category": "Test", "images": "none"}).get_json()
+
+        cached = listings_cache.stats()["queries"]
+        resp = client.get("/listings", query_string={"category": "Test", "images": "none", "stream": "json"})
+        assert resp.status_code == 200
+        assert resp.is_streamed
+        assert sorted(listing["uuid"] for listing in resp.get_json()) == sorted(listing["uuid"] for listing in expected)
+        # streamed pages bypass the cache, so memory does not grow with the table
+        assert listings_cache.stats()["queries"] <= cached
+
+        resp = client.get("/listings", query_string={"category": "Test", "images": "none", "stream": "ndjson"})
+        assert resp.mimetype == "application/x-ndjson"
+        lines = resp.get_data(as_text=True).splitlines()
+        assert sorted(json.loads(line)["uuid"] for line in lines) == sorted(listing["uuid"] for listing in expected)
+
+        assert client.get("/listings", query_string={"stream": "xml"}).status_code == 400
+
+
+def test_get_listings_gzip(monkeypatch):
+    # Responses should be gzip compressed if the client accepts it
+    # compress every body, also the small one of an empty table
+    monkeypatch.setattr("src.app.RESPONSE_COMPRESSION", True)
+    monkeypatch.setattr("src.app.COMPRESS_MIN_BYTES", 0)
+    with app.test_client() as client:
+        expected = client.get("/listings", query_string={"images": "none"}).get_json()
+        resp = client.get("/listings", query_string={"images": "none"}, headers={"Accept-Encoding": "gzip"})
+        assert resp.status_code == 200
+        assert resp.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in resp.headers["Vary"]
+        assert json.loads(gzip.decompress(resp.get_data())) == expected
+
+
+def test_get_listings_filtered():
+    # Filtered requests only return listings matching the filters
+    with app.test_client() as client:
+        resp = client.get("/listings?category=Test&room=Room B&images=none")
+        assert resp.status_code == 200
+        for listing in resp.get_json():
+            assert listing["category"] == "Test"
+            assert listing["room"] == "Room B"
+
+
+def test_get_listings_created_to_inclusive():
+    # created_to should include listings created on that day
+    with app.test_client() as client:
+        new_listing = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "title": "Date Range Listing",
+            "description": "Created on the last day of the range.",
+            "room": "Room J",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": None
+        }
+        post = client.post("/listings?force=true", json=new_listing)
+        assert post.status_code == 201
+        uuid = post.get_json()["uuid"]
+
+        resp = client.get("/listings?room=Room J&created_from=2024-06-01&created_to=2024-06-01&images=none")
+        assert resp.status_code == 200
+        assert uuid in [listing["uuid"] for listing in resp.get_json()]
+
+        client.delete(f"/listings/{uuid}")
+
+
+def test_get_listings_invalid_pagination():
+    # Invalid limits and cursors should be rejected
+    with app.test_client() as client:
+        assert client.get("/listings?limit=0").status_code == 400
+        assert client.get("/listings?limit=2&after=invalid").status_code == 400
+
+
+def test_get_cache_stats():
+    # Repeated reads of the same listing should be served from the cache
+    with app.test_client() as client:
+        new_listing = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "title": "Cached Listing",
+            "description": "Should be read from the cache.",
+            "room": "Room D",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": None
+        }
+        post = client.post("/listings?force=true", json=new_listing)
+        assert post.status_code == 201
+        uuid = post.get_json()["uuid"]
+
+        before = client.get("/cache/stats").get_json()["listings"]
+        assert client.get(f"/listings/{uuid}").status_code == 200
+        after = client.get("/cache/stats").get_json()["listings"]
+        if after["enabled"]:
+            assert after["hits"] == before["hits"] + 1
+
+        client.delete(f"/listings/{uuid}")
+
+
+def test_listings_cache_bounded():
+    # The listings cache should keep at most max_queries query results and max_rows rows
+    cache = ListingsCache(ttl=30, max_rows=3, max_queries=2)
+    for room in ["Room A", "Room B", "Room C"]:
+        rows = [{"uuid": f"{room}-{i}", "room": room} for i in range(2)]
+        cache.put_query({"room": room}, rows)
+    stats = cache.stats()
+    assert stats["queries"] == 2
+    assert stats["rows"] == 3
+    assert cache.get_query({"room": "Room A"})[0] is None
+    assert cache.get_query({"room": "Room C"})[0] is not None
+
+
+def test_image_cache_bounded():
+    # The image cache should keep at most max_entries paths, even without image bytes, and drop expired ones
+    cache = ImageCache(max_bytes=1024, ttl=30, max_entries=2)
+    for name in ["a", "b", "c"]:
+        cache.put(f"images/{name}", None)
+    assert cache.stats()["images"] == 2
+    assert cache.get("images/a") is ImageCache.MISSING
+    assert cache.get("images/c") is None
+
+    expiring = ImageCache(max_bytes=1024, ttl=0, max_entries=2)
+    expiring.put("images/a", b"png")
+    assert expiring.get("images/a") is ImageCache.MISSING
+    assert expiring.stats()["images"] == 0
+    assert expiring.stats()["bytes"] == 0
+
+
+def test_get_listings_concurrent_reads_shared(monkeypatch):
+    # Concurrent identical reads should get the same listings from a single Supabase request
+    fetches = []
+
+    def slow_fetch_listings(listings_query):
+        # keeps the read in flight until all clients have sent their request
+        fetches.append(listings_query)
+        time.sleep(0.5)
+        return fetch_listings(listings_query)
+
+    monkeypatch.setattr("src.app.fetch_listings", slow_fetch_listings)
+
+    def get_listings(_):
+        with app.test_client() as client:
+            resp = client.get("/listings", query_string={"category": "Test", "images": "none"})
+            return resp.status_code, resp.get_json()
+
+    with app.test_client() as client:
+        before = client.get("/cache/stats").get_json()["reads"]
+        listings_cache.clear()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(get_listings, range(8)))
+        after = client.get("/cache/stats").get_json()["reads"]
+
+    assert all(status == 200 for status, _ in results)
+    assert all(body == results[0][1] for _, body in results)
+    assert len(fetches) == 1
+    assert after["shared"] - before["shared"] == 7
+    assert after["in_flight"] == 0
+
+
+def test_get_metrics():
+    # Requests should be counted per route in the Prometheus text format
+    with app.test_client() as client:
+        assert client.get("/listings", query_string={"images": "bogus"}).status_code == 400
+        resp = client.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.mimetype == "text/plain"
+        text = resp.get_data(as_text=True)
+        assert "# TYPE http_request_duration_seconds histogram" in text
+        assert 'http_errors_total{cause="Invalid images mode",endpoint="/listings",status="400"}' in text
+
+
+def test_create_app_config():
+    # An app created with its own config should serve the API and allow CORS for the configured origin only
+    other_app = create_app({"TESTING": True, "FRONTEND_ENDPOINT": "http://frontend.test"})
+    with other_app.test_client() as client:
+        resp = client.get("/listings", query_string={"limit": 1, "images": "none"}, headers={"Origin": "http://frontend.test"})
+        assert resp.status_code == 200
+        assert resp.headers["Access-Control-Allow-Origin"] == "http://frontend.test"
+        resp = client.get("/cache/stats", headers={"Origin": "http://elsewhere.test"})
+        assert "Access-Control-Allow-Origin" not in resp.headers
+
+
+def test_create_listing_duplicate_only_same_room_and_category():
+    # Duplicates are only reported for listings of the same room and category
+    with app.test_client() as client:
+        listing = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "title": "Duplicate Check Umbrella",
+            "description": "Only the same room and category can match.",
+            "room": "Room E",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": None
+        }
+        first = client.post("/listings?force=true", json=listing)
+        assert first.status_code == 201
+
+        duplicate = client.post("/listings", json=listing)
+        assert duplicate.status_code == 409
+        assert first.get_json()["uuid"] in [m["uuid"] for m in duplicate.get_json()["matches"]]
+        for match in duplicate.get_json()["matches"]:
+            assert match["room"] == listing["room"]
+            assert match["category"] == listing["category"]
+
+        client.delete(f"/listings/{first.get_json()['uuid']}")
+
+
+def test_check_duplicates_batch():
+    # The batch duplicate check returns one result per draft in request order
+    with app.test_client() as client:
+        drafts = [
+            {"title": "Test Listing for Fetch", "room": "Room B", "category": "Test"},
+            {"title": "Something else", "room": "Room that does not exist", "category": "Test"},
+        ]
+        resp = client.post("/listings/duplicates:check", json={"listings": drafts})
+        assert resp.status_code == 200
+        results = resp.get_json()["results"]
+        assert len(results) == len(drafts)
+        assert results[1] == {"duplicate": False, "matches": []}
+        for match in results[0]["matches"]:
+            assert match["listing"]["room"] == "Room B"
+            assert match["listing"]["category"] == "Test"
+
+
+def test_check_duplicates_missing_fields():
+    # Drafts without title, room or category should be rejected
+    with app.test_client() as client:
+        resp = client.post("/listings/duplicates:check", json={"listings": [{"title": "Only title"}]})
+        assert resp.status_code == 400
+
+
+def test_get_listing_matches():
+    # A found item should be suggested as match for a similar lost item
+    with app.test_client() as client:
+        listing = {
+            "created_at": "2024-06-01",
+            "description": "Black phone with a cracked screen.",
+            "room": "Room F",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": None
+        }
+        found = client.post("/listings?force=true", json={**listing, "type": "found", "title": "Handy gefunden"})
+        lost = client.post("/listings?force=true", json={**listing, "type": "lost", "title": "Smartphone verloren"})
+        assert found.status_code == 201
+        assert lost.status_code == 201
+
+        resp = client.get(f"/listings/{lost.get_json()['uuid']}/matches?k=5")
+        assert resp.status_code == 200
+        matches = resp.get_json()["matches"]
+        assert len(matches) <= 5
+        assert found.get_json()["uuid"] in [m["listing"]["uuid"] for m in matches]
+        for match in matches:
+            assert match["listing"]["type"] == "found"
+
+        client.delete(f"/listings/{found.get_json()['uuid']}")
+        client.delete(f"/listings/{lost.get_json()['uuid']}")
+
+
+def test_get_listing_matches_added_while_ranking(monkeypatch):
+    # A listing added while matches are ranked should not be missing from later rankings
+    import src.app
+    rank_matches = src.app.rank_matches
+    listing = {
+        "created_at": "2024-06-01",
+        "description": "Grey scarf made of wool.",
+        "room": "Room K",
+        "category": "Test",
+        "contact_email": None,
+        "b64_image": None
+    }
+    added = {**listing, "uuid": str(uuid4()), "type": "found", "title": "Schal gefunden"}
+
+    def rank_matches_during_write(entry):
+        ranked = rank_matches(entry)
+        listings_index.add(added)
+        return ranked
+
+    with app.test_client() as client:
+        lost = client.post("/listings?force=true", json={**listing, "type": "lost", "title": "Schal verloren"})
+        uuid = lost.get_json()["uuid"]
+        monkeypatch.setattr("src.app.rank_matches", rank_matches_during_write)
+        assert client.get(f"/listings/{uuid}/matches").status_code == 200
+        monkeypatch.setattr("src.app.rank_matches", rank_matches)
+
+        resp = client.get(f"/listings/{uuid}/matches")
+        assert added["uuid"] in [m["listing"]["uuid"] for m in resp.get_json()["matches"]]
+
+        listings_index.remove([added["uuid"]])
+        client.delete(f"/listings/{uuid}")
+
+
+def test_get_listing_matches_invalid_k():
+    # k outside of the allowed range should be rejected
+    with app.test_client() as client:
+        resp = client.get("/listings/non-existent-uuid/matches?k=0")
+        assert resp.status_code == 400
+
+
+def test_search_listings():
+    # Search words should also find listings using a synonym of them
+    with app.test_client() as client:
+        new_listing = {
+            "type": "found",
+            "created_at": "2024-06-01",
+            "title": "Smartphone Searchtest",
+            "description": "Found next to the coffee machine.",
+            "room": "Room G",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": None
+        }
+        post = client.post("/listings?force=true", json=new_listing)
+        assert post.status_code == 201
+        uuid = post.get_json()["uuid"]
+
+        resp = client.get("/listings/search?q=handy searchtest&limit=100")
+        assert resp.status_code == 200
+        page = resp.get_json()
+        assert uuid in [result["listing"]["uuid"] for result in page["results"]]
+
+        client.delete(f"/listings/{uuid}")
+        resp = client.get("/listings/search?q=searchtest")
+        assert uuid not in [result["listing"]["uuid"] for result in resp.get_json()["results"]]
+
+
+def test_listings_written_by_other_process(monkeypatch):
+    # Listings created or deleted by another server process should reach matches and search
+    import src.app
+    scans, fetched = [], []
+
+    def load_all_listings(page_size=1000, columns="*"):
+        scans.append(columns)
+        return load_all_listings.original(page_size, columns)
+
+    def load_listings(uuids, chunk_size=200):
+        fetched.extend(uuids)
+        return load_listings.original(uuids, chunk_size)
+
+    load_all_listings.original, load_listings.original = src.app.load_all_listings, src.app.load_listings
+    monkeypatch.setattr("src.app.load_all_listings", load_all_listings)
+    monkeypatch.setattr("src.app.load_listings", load_listings)
+    listing = {
+        "type": "lost",
+        "created_at": "2024-06-01",
+        "title": "Elsewhere Regenschirm",
+        "description": "Created directly in the database.",
+        "room": "Room G",
+        "category": "Test",
+        "contact_email": None
+    }
+    with app.test_client() as client:
+        assert client.get("/listings/search?q=elsewhere").status_code == 200
+        uuid = supabase.table("listings").insert(listing).execute().data[0]["uuid"]
+        # found in the database before the next resync of the index
+        resp = client.get(f"/listings/{uuid}/matches")
+        assert resp.status_code == 200
+
+        scans.clear()
+        listings_index.resync()
+        resp = client.get("/listings/search?q=elsewhere")
+        assert uuid in [result["listing"]["uuid"] for result in resp.get_json()["results"]]
+        # the resync only reads uuids of the whole table, full rows only of new or changed listings
+        assert scans == ["uuid,image_hash"]
+        fetched.clear()
+        listings_index.resync()
+        assert fetched == []
+
+        supabase.table("listings").delete().eq("uuid", uuid).execute()
+        fetched.clear()
+        listings_index.resync()
+        assert uuid not in fetched
+        resp = client.get("/listings/search?q=elsewhere")
+        assert uuid not in [result["listing"]["uuid"] for result in resp.get_json()["results"]]
+
+
+def test_search_listings_missing_query():
+    # A search without search words should be rejected
+    with app.test_client() as client:
+        resp = client.get("/listings/search")
+        assert resp.status_code == 400
+
+
+def test_get_listings_not_modified():
+    # Repeating a request with the received ETag should return 304 without body
+    with app.test_client() as client:
+        resp = client.get("/listings?images=none")
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+
+        resp = client.get("/listings?images=none", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.data == b""
+
+
+def test_get_listings_since_version():
+    # The delta mode returns added and removed listings since a version
+    with app.test_client() as client:
+        version = client.get("/listings?images=none").headers["X-Listings-Version"]
+        new_listing = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "title": "Delta Listing",
+            "description": "Should show up in the delta.",
+            "room": "Room H",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": None
+        }
+        post = client.post("/listings?force=true", json=new_listing)
+        assert post.status_code == 201
+        uuid = post.get_json()["uuid"]
+
+        delta = client.get(f"/listings?since={version}&images=none")
+        assert delta.status_code == 200
+        assert uuid in [listing["uuid"] for listing in delta.get_json()["added"]]
+
+        client.delete(f"/listings/{uuid}")
+        delta = client.get(f"/listings?since={delta.get_json()['version']}&images=none")
+        assert delta.get_json()["removed"] == [uuid]
+
+
+def test_get_listings_since_unknown_version():
+    # Unknown versions require fetching all listings again
+    with app.test_client() as client:
+        resp = client.get("/listings?since=unknown.1")
+        assert resp.status_code == 410
+
+
+def test_get_listings_since_with_stream():
+    # Deltas are not streamed, since combined with stream should be rejected
+    with app.test_client() as client:
+        version = client.get("/listings?images=none").headers["X-Listings-Version"]
+        resp = client.get(f"/listings?since={version}&stream=ndjson")
+        assert resp.status_code == 400
+
+
+def test_get_listings_since_incomplete_change_log(monkeypatch):
+    # Without a complete change log (several workers, no Realtime) deltas are refused
+    monkeypatch.setattr("src.app.CHANGE_LOG_COMPLETE", False)
+    with app.test_client() as client:
+        version = client.get("/listings?images=none").headers["X-Listings-Version"]
+        resp = client.get(f"/listings?since={version}&images=none")
+        assert resp.status_code == 410
+
+
+def test_stream_listings_unknown_last_event_id():
+    # Resuming from an unknown event id should start with a reset event
+    with app.test_client() as client:
+        resp = client.get("/listings/stream", headers={"Last-Event-ID": "unknown.1"}, buffered=False)
+        assert resp.status_code == 200
+        assert resp.mimetype == "text/event-stream"
+        first = next(iter(resp.response)).decode("utf-8")
+        assert first.startswith("event: reset")
+        resp.close()
+
+
+def test_stream_listings_incomplete_change_log(monkeypatch):
+    # Without a complete change log (several workers, no Realtime) the feed is refused
+    monkeypatch.setattr("src.app.CHANGE_LOG_COMPLETE", False)
+    with app.test_client() as client:
+        resp = client.get("/listings/stream")
+        assert resp.status_code == 410
+        assert "version" in resp.get_json()
+
+
+def test_create_listing_invalid_image():
+    # Uploads that are not an image are rejected before anything is stored
+    with app.test_client() as client:
+        listing = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "title": "Invalid Image Listing",
+            "description": "The image of this listing is plain text.",
+            "room": "Room F",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": "data:image/png;base64,aGVsbG8gd29ybGQ="
+        }
+        resp = client.post("/listings?force=true", json=listing)
+        assert resp.status_code == 400
+        assert resp.get_json()["error"] == "Invalid image"
+
+
+def test_get_listing_etag_changes_with_image():
+    # An image replaced by another server process should change the ETag of the listing
+    with app.test_client() as client:
+        new_listing = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "title": "ETag Image Listing",
+            "description": "Image replaced elsewhere.",
+            "room": "Room I",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": None
+        }
+        post = client.post("/listings?force=true", json=new_listing)
+        assert post.status_code == 201
+        uuid = post.get_json()["uuid"]
+        etag = client.get(f"/listings/{uuid}?images=none").headers["ETag"]
+
+        supabase.table("listings").update({"image_hash": "0" * 64}).eq("uuid", uuid).execute()
+        # the cached row of this process would expire after CACHE_TTL
+        listings_cache.remove_rows([uuid])
+        resp = client.get(f"/listings/{uuid}?images=none", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+
+        client.delete(f"/listings/{uuid}")
+
+
+def test_put_listing_image_missing_listing():
+    # Images can only be uploaded for existing listings
+    with app.test_client() as client:
+        resp = client.put(
+            "/listings/00000000-0000-0000-0000-000000000000/image",
+            data=b"\x89PNG\r\n\x1a\n",
+            content_type="image/png"
+        )
+        assert resp.status_code == 404
+
+        resp = client.put("/listings/00000000-0000-0000-0000-000000000000/image")
+        assert resp.status_code == 400
+
+
+def test_create_listings_same_image_stored_once():
+    # The same photo posted twice is stored once and kept until no listing uses it anymore
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (10, 120, 200)).save(buffer, format="PNG")
+    b64_image = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+    with app.test_client() as client:
+        listing = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "title": "Same Image Listing",
+            "description": "Both listings carry the same photo.",
+            "room": "Room G",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": b64_image
+        }
+        first = client.post("/listings?force=true", json=listing).get_json()
+        second = client.post("/listings?force=true", json=listing).get_json()
+        assert first["image_hash"] == second["image_hash"]
+
+        image = client.get(f"/images/{first['image_hash']}")
+        assert image.status_code == 200
+        assert "immutable" in image.headers["Cache-Control"]
+
+        client.delete(f"/listings/{first['uuid']}")
+        assert client.get(f"/images/{first['image_hash']}").status_code == 200
+
+        client.delete(f"/listings/{second['uuid']}")
+        assert client.get(f"/images/{first['image_hash']}").status_code == 404
+
+
+def test_get_image_not_modified_without_download(monkeypatch):
+    # Revalidating a content-addressed image should be answered with 304 without downloading it
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 40, 90)).save(buffer, format="PNG")
+    b64_image = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+    with app.test_client() as client:
+        listing = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "title": "Revalidated Image Listing",
+            "description": "Its image is revalidated.",
+            "room": "Room G",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": b64_image
+        }
+        created = client.post("/listings?force=true", json=listing).get_json()
+        etags = {
+            size: client.get(f"/images/{created['image_hash']}?size={size}").headers["ETag"]
+            for size in ("full", "thumb")
+        }
+
+        def failing_download(listing, size="full"):
+            raise AssertionError("image downloaded")
+
+        monkeypatch.setattr("src.app.download_image", failing_download)
+        for size, etag in etags.items():
+            resp = client.get(f"/images/{created['image_hash']}?size={size}", headers={"If-None-Match": etag})
+            assert resp.status_code == 304
+            assert resp.headers["ETag"] == etag
+
+        monkeypatch.undo()
+        client.delete(f"/listings/{created['uuid']}")
+
+
+def test_delete_old_listings_dry_run():
+    # A dry run only counts old listings, they are deleted by the next real run
+    with app.test_client() as client:
+        old = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "title": "Old Dry Run Listing",
+            "description": "Should survive the dry run.",
+            "room": "Room C",
+            "category": "Test",
+            "contact_email": None,
+            "b64_image": None
+        }
+        post = client.post("/listings?force=true", json=old)
+        uuid = post.get_json()["uuid"]
+
+        run = delete_old_listings(dry_run=True)
+        assert run["dry_run"] is True
+        assert run["rows_deleted"] >= 1
+        assert client.get(f"/listings/{uuid}").status_code == 200
+
+        delete_old_listings()
+        assert client.get(f"/listings/{uuid}").status_code == 404
+
+        stats = client.get("/retention/stats").get_json()
+        assert stats["runs"][-1]["job"] == "retention"
+        assert stats["runs"][-1]["dry_run"] is False
+
+
+def test_create_and_delete_listings_batch():
+    # Listings can be created and deleted in bulk, with one result per item
+    with app.test_client() as client:
+        listing = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "description": "Created by a batch request.",
+            "room": "Room H",
+            "category": "Test",
+            "contact_email": None
+        }
+        resp = client.post("/listings:batch?force=true", json={"listings": [
+            {**listing, "title": "Batch Listing One"},
+            {**listing, "title": "Batch Listing Two"},
+            {"title": "Batch Listing Incomplete"}
+        ]})
+        assert resp.status_code == 200
+        results = resp.get_json()["results"]
+        assert [result["status"] for result in results] == [201, 201, 400]
+
+        uuids = [result["listing"]["uuid"] for result in results[:2]]
+        # uuids are accepted in upper case too
+        resp = client.delete("/listings:batch", json={"uuids": [uuids[0], uuids[1].upper(), "00000000-0000-0000-0000-000000000000"]})
+        assert resp.status_code == 200
+        assert [result["status"] for result in resp.get_json()["results"]] == [200, 200, 404]
+        for uuid in uuids:
+            assert client.get(f"/listings/{uuid}").status_code == 404
+
+
+def test_create_listings_batch_duplicates():
+    # Duplicates within a batch only reference accepted listings and are not counted as duplicate checks
+    def counter(name):
+        return metrics.families[name][3].get((), 0)
+
+    with app.test_client() as client:
+        listing = {
+            "type": "offer",
+            "created_at": "2024-06-01",
+            "description": "Created by a batch request.",
+            "room": "Room Batch Duplicates",
+            "category": "Test",
+            "contact_email": None
+        }
+        comparisons, matches = counter("duplicate_comparisons_total"), counter("duplicate_matches_total")
+        resp = client.post("/listings:batch", json={"listings": [
+            {**listing, "title": "Blue Umbrella"},
+            {**listing, "title": "Blue Umbrella Found"},
+            {**listing, "title": "Umbrella Found Blue"}
+        ]})
+        assert resp.status_code == 200
+        results = resp.get_json()["results"]
+        assert [result["status"] for result in results] == [201, 409, 409]
+        assert results[1]["batch_matches"] == [0]
+        assert results[2]["batch_matches"] == [0]
+        # there are no existing listings in the room, the batch is not compared with itself
+        assert counter("duplicate_comparisons_total") == comparisons
+        assert counter("duplicate_matches_total") == matches
+
+        client.delete("/listings:batch", json={"uuids": [results[0]["listing"]["uuid"]]})